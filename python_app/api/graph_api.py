@@ -1,14 +1,55 @@
-import requests
-from typing import Dict, List, Optional
-import streamlit as st
-from utils.config import GRAPH_API_URL, GRT_PRICE_API_URL, CACHE_TTL_SHORT, CACHE_TTL_LONG
-
-@st.cache_data(ttl=CACHE_TTL_LONG)
-def get_subgraph_deployments() -> List[Dict]:
-    """Fetch all subgraph deployments from The Graph API."""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from utils.config import (
+    GRAPH_API_URL,
+    GRT_PRICE_API_URL,
+    CACHE_TTL_SHORT,
+    CACHE_TTL_LONG,
+    SNAPSHOT_DB_PATH,
+    GRAPH_FETCH_CONCURRENCY
+)
+from api.http_client import post_json
+from utils.cache import cache_data
+from utils.metrics import counter, timed
+from api.snapshot_store import DeploymentSnapshotStore
+
+# Deployments worth curating: not denied and above 100 GRT of signal
+CURATABLE_FILTER = 'deniedAt: 0, signalledTokens_gt: "100000000000000000000"'
+MIN_SIGNALLED_TOKENS = 100 * 10**18
+
+# Wallets resolved per batched signal or balance request
+WALLET_BATCH_SIZE = 100
+
+def keyspace_ranges(parts: int) -> List[Tuple[str, Optional[str]]]:
+    """Split the hex deployment id keyspace into `parts` contiguous ranges.
+
+    Each range is (exclusive lower bound, exclusive upper bound or None) on
+    the id prefix, so together they cover every "0x..." id exactly once.
+    """
+    parts = max(1, min(parts, 256))
+    bounds = [f"0x{(i * 256) // parts:02x}" for i in range(parts)]
+    bounds[0] = ""
+    return list(zip(bounds, bounds[1:] + [None]))
+
+def block_height(block: Optional[int]) -> Optional[Dict[str, int]]:
+    """The `block` argument pinning a query to a block number, or None for the latest block."""
+    return None if block is None else {'number': block}
+
+def iter_deployment_pages(
+    where: str,
+    lower: str = "",
+    upper: Optional[str] = None,
+    block: Optional[int] = None
+) -> Iterator[List[Dict]]:
+    """Yield pages of subgraphDeployments matching `where` with ids in (lower, upper), as of `block`.
+
+    The next page is only requested once the caller asks for it.
+    """
     query_template = '''
-    {
-      subgraphDeployments(first: 1000, where: {id_gt: "%s", deniedAt: 0, signalledTokens_gt: "100000000000000000000"}, orderBy: id, orderDirection: asc) {
+    query($block: Block_height) {
+      subgraphDeployments(first: 1000, block: $block, where: {%s}, orderBy: id, orderDirection: asc) {
         id
         ipfsHash
         signalAmount
@@ -16,16 +57,19 @@ def get_subgraph_deployments() -> List[Dict]:
         stakedTokens
         queryFeesAmount
         queryFeeRebates
+        deniedAt
       }
     }
     '''
     
-    all_deployments = []
-    last_id = ""
+    last_id = lower
     
     while True:
-        query = query_template % last_id
-        response = requests.post(GRAPH_API_URL, json={'query': query})
+        clauses = [f'id_gt: "{last_id}"', where]
+        if upper is not None:
+            clauses.append(f'id_lt: "{upper}"')
+        query = query_template % ', '.join(clause for clause in clauses if clause)
+        response = post_json(GRAPH_API_URL, {'query': query, 'variables': {'block': block_height(block)}})
         if response.status_code != 200:
             raise Exception(f"Query failed with status code {response.status_code}: {response.text}")
         
@@ -35,14 +79,145 @@ def get_subgraph_deployments() -> List[Dict]:
         if not deployments:
             break
         
-        all_deployments.extend(deployments)
+        counter('graph_pages_fetched_total')
         last_id = deployments[-1]['id']
+        yield deployments
+
+def fetch_deployment_range(
+    where: str,
+    lower: str = "",
+    upper: Optional[str] = None,
+    block: Optional[int] = None
+) -> List[Dict]:
+    """Page through subgraphDeployments matching `where` with ids in (lower, upper), as of `block`."""
+    return [deployment for page in iter_deployment_pages(where, lower, upper, block) for deployment in page]
+
+def stream_deployment_pages(where: str, concurrency: int = 1, block: Optional[int] = None) -> Iterator[List[Dict]]:
+    """Yield pages of subgraphDeployments matching `where` as they arrive.
+
+    With `concurrency` above 1 each keyspace range is paged on its own
+    thread and pages are yielded in arrival order, not id order. At most
+    two pages per range wait for the consumer; ranges that get ahead block
+    until it catches up. Closing the generator early stops every range
+    after its current page.
+    """
+    if concurrency <= 1:
+        yield from iter_deployment_pages(where, block=block)
+        return
+    
+    ranges = keyspace_ranges(concurrency)
+    pages: queue.Queue = queue.Queue(maxsize=len(ranges) * 2)
+    stop = threading.Event()
+    done = object()  # Marks the end of one range
+
+    def put(item) -> bool:
+        """Wait for room in the queue; gives up once the consumer has stopped."""
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(bounds: Tuple[str, Optional[str]]) -> None:
+        try:
+            for page in iter_deployment_pages(where, *bounds, block=block):
+                if not put(page):
+                    break
+        finally:
+            put(done)
+
+    executor = ThreadPoolExecutor(max_workers=len(ranges))
+    try:
+        futures = [executor.submit(produce, bounds) for bounds in ranges]
+        finished = 0
+        while finished < len(futures):
+            page = pages.get()
+            if page is done:
+                finished += 1
+            else:
+                yield page
+        for future in futures:
+            future.result()  # Re-raise the first failed range
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+@timed('graph_api.fetch_deployments')
+def fetch_deployments(where: str, concurrency: int = 1, block: Optional[int] = None) -> List[Dict]:
+    """Fetch subgraphDeployments matching `where` as of `block`, ordered by id.
+
+    With `concurrency` above 1 the id keyspace is split into that many
+    ranges, each paged on its own thread over the pooled session.
+    """
+    if concurrency <= 1:
+        return fetch_deployment_range(where, block=block)
+    
+    ranges = keyspace_ranges(concurrency)
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        pages = executor.map(lambda bounds: fetch_deployment_range(where, *bounds, block), ranges)
+        return [deployment for page in pages for deployment in page]
+
+@timed('graph_api.get_latest_block_number')
+def get_latest_block_number() -> int:
+    """Fetch the block number the network subgraph has indexed up to."""
+    response = post_json(GRAPH_API_URL, {'query': '{ _meta { block { number } } }'})
+    if response.status_code != 200:
+        raise Exception(f"Query failed with status code {response.status_code}: {response.text}")
+    return int(response.json()['data']['_meta']['block']['number'])
+
+def is_curatable(deployment: Dict) -> bool:
+    """Apply CURATABLE_FILTER locally to a deployment fetched without it."""
+    return int(deployment.get('deniedAt') or 0) == 0 and int(deployment['signalledTokens']) > MIN_SIGNALLED_TOKENS
+
+def refresh_deployment_snapshot(block: Optional[int] = None) -> DeploymentSnapshotStore:
+    """Bring the on-disk deployment snapshot up to `block` (default: latest) and return its store.
+
+    The first run streams the full deployment set into the snapshot page by
+    page. Later runs only fetch deployments changed since the snapshot's
+    block, with no filter so that deployments which stopped being curatable
+    get dropped. Every query is pinned to `block`, so the snapshot is
+    exactly the network state at that block.
+
+    The snapshot never moves backwards: if the store is already past
+    `block` (another process advanced it, or a load-balanced gateway
+    reported a lagging block) it is returned as is. The store's
+    block_number() is always the block its data was read at, so callers
+    pin their other reads to that rather than to `block`.
+    """
+    store = DeploymentSnapshotStore(SNAPSHOT_DB_PATH)
+    last_block = store.block_number()
+    block = get_latest_block_number() if block is None else block
     
-    return all_deployments
+    if last_block is None:
+        pages = stream_deployment_pages(CURATABLE_FILTER, GRAPH_FETCH_CONCURRENCY, block)
+        store.replace_all((deployment for page in pages for deployment in page), block)
+    elif block > last_block:
+        changed = fetch_deployments(f'_change_block: {{number_gte: {last_block}}}', block=block)
+        store.merge(changed, block, keep=is_curatable)
+    
+    return store
+
+@cache_data(ttl=CACHE_TTL_LONG)
+@timed('graph_api.get_subgraph_deployments')
+def get_subgraph_deployments(block: Optional[int] = None) -> List[Dict]:
+    """Fetch all subgraph deployments as of `block`, refreshing the on-disk snapshot incrementally."""
+    return refresh_deployment_snapshot(block).load()
 
-@st.cache_data(ttl=CACHE_TTL_SHORT)
+def get_pinned_deployments(block: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """Fetch all subgraph deployments as of `block` or later, with the block they were actually read at."""
+    store = refresh_deployment_snapshot(block)
+    return store.load(), store.block_number()
+
+@cache_data(ttl=CACHE_TTL_SHORT)
+@timed('graph_api.get_grt_price')
 def get_grt_price() -> float:
-    """Fetch current GRT price from The Graph API."""
+    """Fetch current GRT price from The Graph API.
+
+    The price subgraph indexes another chain, so unlike the network subgraph
+    queries this one cannot be pinned to the network block.
+    """
     query = """
     {
       assetPairs(
@@ -53,90 +228,116 @@ def get_grt_price() -> float:
       }
     }
     """
-    response = requests.post(GRT_PRICE_API_URL, json={'query': query})
+    response = post_json(GRT_PRICE_API_URL, {'query': query})
     data = response.json()
     return float(data['data']['assetPairs'][0]['currentPrice'])
 
-@st.cache_data(ttl=CACHE_TTL_LONG)
-def get_user_curation_signal(wallet_address: str) -> Dict[str, float]:
-    """Fetch user's curation signals from The Graph API."""
+def wallet_batches(wallet_addresses: List[str]) -> List[List[str]]:
+    """Lowercase and deduplicate wallets, then split them into request-sized batches."""
+    wallets = list(dict.fromkeys(wallet.lower() for wallet in wallet_addresses))
+    return [wallets[i:i + WALLET_BATCH_SIZE] for i in range(0, len(wallets), WALLET_BATCH_SIZE)]
+
+def add_name_signals(user_signals: Dict[str, Dict[str, float]], name_signals: List[Dict]) -> None:
+    """Add a page of nameSignals to `user_signals`, keyed by curator then IPFS hash."""
+    for signal in name_signals:
+        subgraph = signal.get('subgraph') or {}
+        current_version = subgraph.get('currentVersion') or {}
+        subgraph_deployment = current_version.get('subgraphDeployment') or {}
+        
+        ipfs_hash = subgraph_deployment.get('ipfsHash')
+        signal_amount = float(signal.get('signal', 0)) / 1e18
+        
+        if ipfs_hash:
+            user_signals[signal['curator']['id']][ipfs_hash] = signal_amount
+
+@cache_data(ttl=CACHE_TTL_SHORT)
+@timed('graph_api.get_wallet_data')
+def get_wallet_data(
+    wallet_addresses: List[str],
+    block: Optional[int] = None,
+    with_signals: bool = True
+) -> Tuple[Dict[str, Dict[str, float]], Dict[str, float]]:
+    """Fetch curation signals and GRT balances for wallets as of `block`, in one request per batch.
+
+    Returns (signals keyed by wallet then IPFS hash, balances keyed by
+    wallet), with lowercased wallets. Up to WALLET_BATCH_SIZE wallets share
+    a request. Each batch's first request carries both the nameSignals and
+    graphAccounts roots; only curators with more than a page of signals need
+    further, signals-only requests, and a short page ends the paging. With
+    `with_signals` False only balances are fetched and signals stay empty.
+    """
     query = """
-    query($wallet: String!) {
-      curator(id: $wallet) {
+    query($wallets: [String!]!, $lastId: String!, $withSignals: Boolean!, $withBalances: Boolean!, $block: Block_height) {
+      signals: nameSignals(first: 1000, block: $block, where: {curator_in: $wallets, id_gt: $lastId}, orderBy: id, orderDirection: asc) @include(if: $withSignals) {
         id
-        nameSignals(first: 1000) {
-          signalledTokens
-          unsignalledTokens
-          signal
-          subgraph {
-            id
-            metadata {
-              displayName
-            }
-            currentVersion {
-              id
-              subgraphDeployment {
-                ipfsHash
-                pricePerShare
-                signalAmount
-              }
+        signal
+        curator {
+          id
+        }
+        subgraph {
+          currentVersion {
+            subgraphDeployment {
+              ipfsHash
             }
           }
         }
       }
+      accounts: graphAccounts(first: 1000, block: $block, where: {id_in: $wallets}) @include(if: $withBalances) {
+        id
+        balance
+      }
     }
     """
     
-    variables = {
-        "wallet": wallet_address.lower()
-    }
+    user_signals = {wallet.lower(): {} for wallet in wallet_addresses}
+    balances = {wallet.lower(): 0.0 for wallet in wallet_addresses}
     
-    response = requests.post(GRAPH_API_URL, json={'query': query, 'variables': variables})
-    if response.status_code != 200:
-        raise Exception(f"Query failed with status code {response.status_code}: {response.text}")
-    
-    data = response.json()
-    curator_data = data.get('data', {}).get('curator')
-    
-    user_signals = {}
-    if curator_data and curator_data.get('nameSignals'):
-        for signal in curator_data['nameSignals']:
-            subgraph = signal.get('subgraph', {})
-            current_version = subgraph.get('currentVersion', {})
-            subgraph_deployment = current_version.get('subgraphDeployment', {})
+    for batch in wallet_batches(wallet_addresses):
+        last_id = ""
+        with_balances = True
+        while True:
+            variables = {
+                "wallets": batch,
+                "lastId": last_id,
+                "withSignals": with_signals,
+                "withBalances": with_balances,
+                "block": block_height(block)
+            }
+            response = post_json(GRAPH_API_URL, {'query': query, 'variables': variables})
+            if response.status_code != 200:
+                raise Exception(f"Query failed with status code {response.status_code}: {response.text}")
             
-            ipfs_hash = subgraph_deployment.get('ipfsHash')
-            signal_amount = float(signal.get('signal', 0)) / 1e18
+            data = response.json().get('data') or {}
+            if with_balances:
+                for account in data.get('accounts') or []:
+                    # Convert balance from wei to GRT
+                    balances[account['id']] = float(account.get('balance', 0)) / 1e18
+                with_balances = False
+            if not with_signals:
+                break
             
-            if ipfs_hash:
-                user_signals[ipfs_hash] = signal_amount
+            name_signals = data.get('signals') or []
+            add_name_signals(user_signals, name_signals)
+            if len(name_signals) < 1000:  # A short page is the last one
+                break
+            last_id = name_signals[-1]['id']
     
-    return user_signals
+    return user_signals, balances
 
-@st.cache_data(ttl=CACHE_TTL_SHORT)
-def get_account_balance(wallet_address: str) -> float:
+def get_user_curation_signals(wallet_addresses: List[str], block: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+    """Fetch curation signals for many wallets as of `block`, keyed by lowercased wallet then IPFS hash."""
+    return get_wallet_data(wallet_addresses, block)[0]
+
+def get_account_balances(wallet_addresses: List[str], block: Optional[int] = None) -> Dict[str, float]:
+    """Fetch GRT balances for many wallets as of `block`, keyed by lowercased wallet."""
+    return get_wallet_data(wallet_addresses, block, with_signals=False)[1]
+
+def get_user_curation_signal(wallet_address: str, block: Optional[int] = None) -> Dict[str, float]:
+    """Fetch user's curation signals from The Graph API."""
+    wallet = wallet_address.lower()
+    return get_wallet_data([wallet], block)[0][wallet]
+
+def get_account_balance(wallet_address: str, block: Optional[int] = None) -> float:
     """Fetch account's GRT balance from The Graph API."""
-    query = """
-    query($wallet: String!) {
-      graphAccounts(where: {id: $wallet}) {
-        id
-        balance
-      }
-    }
-    """
-    
-    variables = {
-        "wallet": wallet_address.lower()
-    }
-    
-    response = requests.post(GRAPH_API_URL, json={'query': query, 'variables': variables})
-    if response.status_code != 200:
-        raise Exception(f"Query failed with status code {response.status_code}: {response.text}")
-    
-    data = response.json()
-    accounts = data.get('data', {}).get('graphAccounts', [])
-    
-    if accounts:
-        # Convert balance from wei to GRT
-        return float(accounts[0].get('balance', 0)) / 1e18
-    return 0.0
+    wallet = wallet_address.lower()
+    return get_wallet_data([wallet], block)[1][wallet]
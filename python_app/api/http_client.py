@@ -0,0 +1,41 @@
+import threading
+from typing import Dict, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.config import HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_TIMEOUT
+from utils.metrics import counter, span
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use.
+
+    Connections are kept alive across calls, and transient failures
+    (connection errors, 429 and 5xx) are retried with exponential backoff.
+    GraphQL and pg-meta queries are read-only, so POSTs are retried as well.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_MAX_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET', 'POST']),
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def post_json(url: str, payload: Dict, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """POST a JSON payload through the pooled session with the default timeout."""
+    with span('http.post'):
+        response = get_session().post(url, json=payload, headers=headers, timeout=HTTP_TIMEOUT)
+    counter('http_requests_total', status=response.status_code)
+    return response
@@ -0,0 +1,24 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict
+from utils.metrics import counter, span
+
+def fetch_concurrently(sources: Dict[str, Callable[[], object]]) -> Dict[str, Future]:
+    """Start every source at once, each on its own thread, and return their futures by name.
+
+    Callers wait only on the futures they need, so work that depends on one
+    source can start as soon as that source is ready. A failing source only
+    fails its own future.
+    """
+    def run(name: str, fetch: Callable[[], object]):
+        try:
+            with span(f'loader.{name}'):
+                return fetch()
+        except Exception:
+            counter('load_errors_total', source=name)
+            raise
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(sources)), thread_name_prefix='loader')
+    try:
+        return {name: executor.submit(run, name, fetch) for name, fetch in sources.items()}
+    finally:
+        executor.shutdown(wait=False)  # Threads exit once their source is done
@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import tempfile
+from typing import List, Optional
+import numpy as np
+from models.opportunities import OpportunityTable
+
+CURRENT_FILE = 'CURRENT'  # Names the most recently published snapshot
+META_FILE = 'meta.json'
+
+def snapshot_path(directory: str, snapshot_id: str) -> str:
+    return os.path.join(directory, snapshot_id)
+
+def publish_opportunities(table: OpportunityTable, snapshot_id: str, directory: str) -> str:
+    """Write a table as one .npy file per column and make it the current snapshot.
+
+    IPFS hashes are stored as fixed-width strings so every column can be
+    memory-mapped. The files are written to a temporary directory and moved
+    into place with os.replace, so readers never see a partial snapshot.
+    Snapshots are content-addressed: publishing an id that already exists
+    only moves the CURRENT pointer. Returns the snapshot's directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = snapshot_path(directory, snapshot_id)
+    if not os.path.isdir(path):
+        staging = tempfile.mkdtemp(prefix=f'.{snapshot_id}-', dir=directory)
+        try:
+            width = max((len(ipfs_hash) for ipfs_hash in table.ipfs_hash), default=1)
+            for column in OpportunityTable.COLUMNS:
+                values = getattr(table, column)
+                if column == 'ipfs_hash':
+                    values = np.asarray(values, dtype=f'U{width}')
+                np.save(os.path.join(staging, f'{column}.npy'), values)
+            with open(os.path.join(staging, META_FILE), 'w') as f:
+                json.dump({'snapshot_id': snapshot_id, 'rows': len(table)}, f)
+            os.replace(staging, path)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+            if not os.path.isdir(path):  # Another process publishing the same id wins the race otherwise
+                raise
+
+    _write_atomically(os.path.join(directory, CURRENT_FILE), snapshot_id)
+    return path
+
+def _write_atomically(path: str, text: str) -> None:
+    """Replace a small file so that readers see either the old or the new text."""
+    fd, staging = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+    os.replace(staging, path)
+
+def current_snapshot_id(directory: str) -> Optional[str]:
+    """Id of the most recently published snapshot, or None if there is none."""
+    try:
+        with open(os.path.join(directory, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def load_opportunities(directory: str, snapshot_id: Optional[str] = None) -> OpportunityTable:
+    """Attach to a published snapshot (the current one by default) without copying it.
+
+    Every column is a read-only memory map of its file, so processes loading
+    the same snapshot share one copy in the page cache. Raises
+    FileNotFoundError if the snapshot does not exist.
+    """
+    snapshot_id = snapshot_id or current_snapshot_id(directory)
+    if snapshot_id is None:
+        raise FileNotFoundError(f"No opportunity snapshot published in {directory}")
+    path = snapshot_path(directory, snapshot_id)
+    return OpportunityTable(**{
+        column: np.load(os.path.join(path, f'{column}.npy'), mmap_mode='r')
+        for column in OpportunityTable.COLUMNS
+    })
+
+def prune_snapshots(directory: str, keep: int) -> List[str]:
+    """Delete all but the `keep` newest snapshots, never the current one. Returns the deleted ids.
+
+    Processes still mapping a deleted snapshot keep reading it; the files
+    are only freed once the last map is closed.
+    """
+    current = current_snapshot_id(directory)
+    snapshots = sorted(
+        (entry for entry in os.scandir(directory) if entry.is_dir() and not entry.name.startswith('.')),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True
+    )
+    deleted = []
+    for entry in snapshots[keep:]:
+        if entry.name != current:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            deleted.append(entry.name)
+    return deleted
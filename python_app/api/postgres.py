@@ -0,0 +1,96 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator
+from utils.config import SUPABASE_DB_URL, DB_POOL_SIZE, DB_FETCH_BATCH_SIZE
+
+HOURLY_VOLUME_SQL = """
+SELECT
+    subgraph_deployment_ipfs_hash,
+    end_epoch,
+    SUM(total_query_fees) AS total_query_fees,
+    SUM(query_count) AS query_count
+FROM qos_hourly_query_volume
+WHERE end_epoch >= {placeholder}
+GROUP BY subgraph_deployment_ipfs_hash, end_epoch
+"""
+
+def timestamp_literal(since: datetime) -> str:
+    """SQL literal for `since` as a naive UTC timestamp, for endpoints that can't bind parameters.
+
+    The literal is formatted from the datetime's fields, so only digits and
+    separators ever reach the SQL text. Raises TypeError for anything that
+    is not a datetime.
+    """
+    if not isinstance(since, datetime):
+        raise TypeError(f"Expected a datetime, got {type(since).__name__}")
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return f"'{since:%Y-%m-%d %H:%M:%S.%f}'"
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def is_configured() -> bool:
+    """Whether a direct database connection string is configured."""
+    return bool(SUPABASE_DB_URL)
+
+def get_pool():
+    """Return the process-wide PostgreSQL connection pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            try:
+                from psycopg2.pool import ThreadedConnectionPool
+            except ImportError:
+                raise Exception("SUPABASE_DB_URL is set but psycopg2 is not installed (pip install psycopg2-binary)")
+            _pool = ThreadedConnectionPool(1, DB_POOL_SIZE, SUPABASE_DB_URL)
+        return _pool
+
+@contextmanager
+def pooled_connection() -> Iterator:
+    """Borrow a connection from the pool and always hand it back clean."""
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        conn.rollback()  # Read-only work; end the transaction the server-side cursor needed
+        pool.putconn(conn)
+
+def stream_hourly_volume(
+    conn,
+    since: datetime,
+    placeholder: str = '%s',
+    server_side: bool = False,
+    batch_size: int = DB_FETCH_BATCH_SIZE
+) -> Iterator[Dict]:
+    """Yield per-hour, per-deployment volume rows from `since` (inclusive) as they arrive.
+
+    `conn` is any DB-API connection. `since` is bound as a statement
+    parameter, never interpolated. `placeholder` is the driver's parameter
+    marker, "%s" for psycopg2 and "?" for sqlite3. With `server_side`,
+    psycopg2 keeps the result set on the server behind a named cursor and
+    sends it `batch_size` rows at a time.
+    """
+    cursor = conn.cursor(name='hourly_volume') if server_side else conn.cursor()
+    if server_side:
+        cursor.itersize = batch_size
+    try:
+        cursor.execute(HOURLY_VOLUME_SQL.format(placeholder=placeholder), (since,))
+        columns = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            if columns is None:
+                columns = [column[0] for column in cursor.description]
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        cursor.close()
+
+def query_hourly_volume(since: datetime) -> Iterator[Dict]:
+    """Stream hourly volume rows through a pooled connection and a server-side cursor."""
+    with pooled_connection() as conn:
+        yield from stream_hourly_volume(conn, since, server_side=True)
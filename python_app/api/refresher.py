@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+from api.graph_api import get_pinned_deployments, get_grt_price, get_latest_block_number
+from api.loader import fetch_concurrently
+from api.opportunity_store import load_opportunities, prune_snapshots, publish_opportunities
+from api.supabase_api import fetch_query_data
+from models.opportunities import OpportunityTable, calculate_opportunities
+from utils.config import NETWORK_REFRESH_INTERVAL, OPPORTUNITY_SNAPSHOTS_KEPT
+from utils.metrics import counter, span
+
+logger = logging.getLogger(__name__)
+
+def network_state_id(block_number: int, query_counts: Mapping[str, int], grt_price: float) -> str:
+    """Content address of one network state: the pinned block, the query volume window and the price.
+
+    Everything computed from a snapshot depends only on these, so results
+    cached under the id stay valid until the network actually moves.
+    """
+    state = [block_number, grt_price, sorted(query_counts.items())]
+    return hashlib.sha256(json.dumps(state).encode()).hexdigest()[:16]
+
+@dataclass(frozen=True)
+class NetworkSnapshot:
+    """One consistent view of network data, never modified after it is published."""
+    version: int
+    snapshot_id: str  # Content address of the inputs; equal ids mean equal results
+    block_number: int  # Network subgraph block every deployment was read at
+    deployments: Tuple[Dict, ...]
+    query_fees: Mapping[str, float]
+    query_counts: Mapping[str, int]
+    grt_price: float
+    opportunities: OpportunityTable
+    refreshed_at: float  # Unix time the snapshot was built
+
+class NetworkRefresher:
+    """Refreshes network data in a background thread and serves the last good snapshot.
+
+    Readers call `snapshot()` and get whatever was last published, without
+    waiting on the network. Each refresh fetches the latest block, query
+    volume and the GRT price concurrently, reads deployments as of that
+    block (or the later block the deployment store is already at, which then
+    becomes the snapshot's block), computes opportunities once, and swaps
+    the new snapshot in whole. A refresh that finds the same snapshot id as
+    the current snapshot keeps it, skipping the recompute. With a
+    `snapshot_dir` the opportunities are memory-mapped from files that every
+    process on the host shares. If a source fails, its previous value is
+    kept and the error is logged, so one bad round-trip never replaces good
+    data.
+    """
+
+    def __init__(
+        self,
+        interval: float = NETWORK_REFRESH_INTERVAL,
+        fetch_block: Callable[[], int] = get_latest_block_number,
+        fetch_deployments: Callable[[int], Tuple[List[Dict], int]] = get_pinned_deployments,
+        fetch_query_data: Callable[[], Tuple[Dict[str, float], Dict[str, int]]] = fetch_query_data,
+        fetch_grt_price: Callable[[], float] = get_grt_price.__wrapped__,
+        snapshot_dir: Optional[str] = None
+    ):
+        self.interval = interval
+        self.fetch_block = fetch_block
+        self.fetch_deployments = fetch_deployments
+        self.fetch_query_data = fetch_query_data
+        self.fetch_grt_price = fetch_grt_price
+        self.snapshot_dir = snapshot_dir
+        self.last_error: Optional[Exception] = None
+        self._snapshot: Optional[NetworkSnapshot] = None
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def snapshot(self, timeout: Optional[float] = None) -> Optional[NetworkSnapshot]:
+        """Return the current snapshot.
+
+        Before the first refresh attempt has finished this waits for it, up
+        to `timeout` seconds. Returns None if there is still nothing good.
+        """
+        if self._snapshot is None:
+            self._ready.wait(timeout)
+        return self._snapshot
+
+    def refresh(self) -> Optional[NetworkSnapshot]:
+        """Fetch every source once and publish a new snapshot; returns the current snapshot."""
+        try:
+            with span('refresher.refresh'):
+                return self._publish()
+        finally:
+            self._ready.set()
+
+    def _publish(self) -> Optional[NetworkSnapshot]:
+        with self._refresh_lock:
+            previous = self._snapshot
+            # The sources are independent round-trips, so a refresh costs the slowest one.
+            # Deployments are read as of the block fetched alongside the others, so they wait for it.
+            futures = fetch_concurrently({
+                'block': self.fetch_block,
+                'query data': self.fetch_query_data,
+                'GRT price': self.fetch_grt_price
+            })
+            futures.update(fetch_concurrently({
+                'deployments': lambda: self.fetch_deployments(futures['block'].result())
+            }))
+            pinned = self._result('deployments', futures['deployments'], None)
+            volume = self._result('query data', futures['query data'], previous and (previous.query_fees, previous.query_counts))
+            grt_price = self._result('GRT price', futures['GRT price'], previous and previous.grt_price)
+            if pinned is not None:
+                deployments, block_number = pinned  # Possibly past the requested block if the store was ahead
+            elif previous is not None:
+                deployments, block_number = previous.deployments, previous.block_number  # Keep the block they were read at
+            else:
+                deployments = block_number = None
+            if deployments is None or volume is None or grt_price is None:
+                return previous  # Nothing good to publish yet
+
+            query_fees, query_counts = volume
+            state_id = network_state_id(block_number, query_counts, grt_price)
+            if previous is not None and previous.snapshot_id == state_id:
+                counter('refresh_unchanged_total')
+                return previous  # The network has not moved; keep what was computed for it
+
+            self._snapshot = NetworkSnapshot(
+                version=previous.version + 1 if previous else 1,
+                snapshot_id=state_id,
+                block_number=block_number,
+                deployments=tuple(deployments),
+                query_fees=MappingProxyType(dict(query_fees)),
+                query_counts=MappingProxyType(dict(query_counts)),
+                grt_price=grt_price,
+                opportunities=self._opportunities(state_id, deployments, query_fees, query_counts, grt_price),
+                refreshed_at=time.time()
+            )
+            return self._snapshot
+
+    def _opportunities(
+        self,
+        state_id: str,
+        deployments: Sequence[Dict],
+        query_fees: Mapping[str, float],
+        query_counts: Mapping[str, int],
+        grt_price: float
+    ) -> OpportunityTable:
+        """Opportunities for one network state, shared through `snapshot_dir` when it is set.
+
+        If another process already published this state the table is mapped
+        from its files. Otherwise it is computed, published and mapped back,
+        so every process reads the same pages instead of holding its own copy.
+        """
+        if self.snapshot_dir is None:
+            return calculate_opportunities(deployments, query_fees, query_counts, grt_price)
+        try:
+            table = load_opportunities(self.snapshot_dir, state_id)
+            counter('opportunity_snapshots_attached_total')
+            return table
+        except FileNotFoundError:
+            pass
+
+        table = calculate_opportunities(deployments, query_fees, query_counts, grt_price)
+        try:
+            publish_opportunities(table, state_id, self.snapshot_dir)
+            prune_snapshots(self.snapshot_dir, OPPORTUNITY_SNAPSHOTS_KEPT)
+            return load_opportunities(self.snapshot_dir, state_id)
+        except OSError:
+            logger.exception("Publishing the opportunity snapshot failed; keeping it in memory")
+            return table
+
+    def _result(self, name: str, future: Future, fallback):
+        """Wait for one source, falling back to its previous value on error."""
+        try:
+            return future.result()
+        except Exception as e:
+            self.last_error = e
+            counter('refresh_errors_total', source=name)
+            logger.exception(f"Refreshing {name} failed; keeping the previous value")
+            return fallback
+
+    def start(self) -> 'NetworkRefresher':
+        """Start refreshing every `interval` seconds in a daemon thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='network-refresher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop the background thread after its current refresh."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Building the network snapshot failed")
+            self._stop.wait(self.interval)
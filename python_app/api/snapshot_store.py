@@ -0,0 +1,101 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+# Deployment fields kept in the snapshot, as returned by the network subgraph
+DEPLOYMENT_FIELDS = (
+    'id',
+    'ipfsHash',
+    'signalAmount',
+    'signalledTokens',
+    'stakedTokens',
+    'queryFeesAmount',
+    'queryFeeRebates'
+)
+
+class DeploymentSnapshotStore:
+    """On-disk SQLite snapshot of subgraph deployments keyed by deployment id."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            columns = ', '.join(f'"{field}" TEXT' for field in DEPLOYMENT_FIELDS[1:])
+            conn.execute(f'CREATE TABLE IF NOT EXISTS deployments ("id" TEXT PRIMARY KEY, {columns})')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection that commits on success and is always closed."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')  # Readers don't block the refreshing writer
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def block_number(self) -> Optional[int]:
+        """Block number the snapshot is up to date with, or None if it is empty."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'block_number'").fetchone()
+        return int(row[0]) if row else None
+
+    def load(self) -> List[Dict]:
+        """Load every deployment in the snapshot, ordered by id."""
+        columns = ', '.join(f'"{field}"' for field in DEPLOYMENT_FIELDS)
+        with self._connect() as conn:
+            rows = conn.execute(f'SELECT {columns} FROM deployments ORDER BY id').fetchall()
+        return [dict(zip(DEPLOYMENT_FIELDS, row)) for row in rows]
+
+    def iter_pages(self, page_size: int = 1000) -> Iterator[List[Dict]]:
+        """Yield every deployment in the snapshot, ordered by id, `page_size` at a time."""
+        columns = ', '.join(f'"{field}"' for field in DEPLOYMENT_FIELDS)
+        with self._connect() as conn:
+            cursor = conn.execute(f'SELECT {columns} FROM deployments ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(page_size)
+                if not rows:
+                    break
+                yield [dict(zip(DEPLOYMENT_FIELDS, row)) for row in rows]
+
+    def replace_all(self, deployments: Iterable[Dict], block_number: int) -> None:
+        """Replace the whole snapshot with a full fetch taken at `block_number`.
+
+        `deployments` may be a generator; rows are written as it yields them
+        and nothing is kept if it raises.
+        """
+        with self._connect() as conn:
+            conn.execute('DELETE FROM deployments')
+            self._upsert(conn, deployments)
+            self._set_block_number(conn, block_number)
+
+    def merge(self, changed: List[Dict], block_number: int, keep: Callable[[Dict], bool]) -> None:
+        """Merge deployments changed since the last snapshot.
+
+        Changed deployments that still pass `keep` are upserted, the rest
+        (denied, or signal dropped below the threshold) are removed.
+        """
+        kept = [d for d in changed if keep(d)]
+        dropped = [(d['id'],) for d in changed if not keep(d)]
+        with self._connect() as conn:
+            self._upsert(conn, kept)
+            conn.executemany('DELETE FROM deployments WHERE id = ?', dropped)
+            self._set_block_number(conn, block_number)
+
+    def _upsert(self, conn: sqlite3.Connection, deployments: Iterable[Dict]) -> None:
+        columns = ', '.join(f'"{field}"' for field in DEPLOYMENT_FIELDS)
+        placeholders = ', '.join('?' for _ in DEPLOYMENT_FIELDS)
+        conn.executemany(
+            f'INSERT OR REPLACE INTO deployments ({columns}) VALUES ({placeholders})',
+            (tuple(d.get(field) for field in DEPLOYMENT_FIELDS) for d in deployments)
+        )
+
+    def _set_block_number(self, conn: sqlite3.Connection, block_number: int) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('block_number', ?)",
+            (str(block_number),)
+        )
@@ -1,13 +1,16 @@
-import requests
 import base64
-from datetime import datetime, timedelta
-import streamlit as st
-from typing import Dict, Tuple
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from api import postgres
+from api.http_client import post_json
+from utils.cache import report_error
+from utils.metrics import counter, timed
 from utils.config import (
     SUPABASE_USERNAME,
     SUPABASE_PASSWORD,
     SUPABASE_API_URL,
-    CACHE_TTL_LONG
+    QUERY_VOLUME_REFRESH_INTERVAL
 )
 
 def get_auth_headers() -> Dict[str, str]:
@@ -22,29 +25,27 @@ def get_auth_headers() -> Dict[str, str]:
         "Accept": "application/json"
     }
 
-@st.cache_data(ttl=CACHE_TTL_LONG)
-def query_supabase() -> list:
-    """Query Supabase for query volume data."""
+def query_hourly_volume(since: datetime) -> Iterable[Dict]:
+    """Query per-hour, per-deployment query volume from `since` (inclusive).
+
+    Streams rows over a pooled PostgreSQL connection when SUPABASE_DB_URL is
+    set, and falls back to the pg-meta HTTP endpoint otherwise.
+    """
+    if postgres.is_configured():
+        return postgres.query_hourly_volume(since)
+    return query_hourly_volume_pg_meta(since)
+
+def query_hourly_volume_pg_meta(since: datetime) -> list:
+    """Query hourly volume through the pg-meta endpoint, which returns one JSON array."""
     try:
-        # Get data from the last week
-        week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-
-        # SQL query
-        sql_query = f"""
-        SELECT 
-            subgraph_deployment_ipfs_hash,
-            SUM(total_query_fees) as total_query_fees,
-            SUM(query_count) as query_count
-        FROM qos_hourly_query_volume 
-        WHERE end_epoch > '{week_ago}'
-        GROUP BY subgraph_deployment_ipfs_hash
-        """
+        # pg-meta takes plain SQL text, so `since` goes in as a literal built from its fields
+        sql_query = postgres.HOURLY_VOLUME_SQL.format(placeholder=postgres.timestamp_literal(since))
 
         # Execute the query
-        response = requests.post(
+        response = post_json(
             SUPABASE_API_URL,
-            headers=get_auth_headers(),
-            json={"query": sql_query}
+            {"query": sql_query},
+            headers=get_auth_headers()
         )
 
         if response.status_code == 200:
@@ -55,25 +56,106 @@ def query_supabase() -> list:
     except Exception as e:
         raise Exception(f"Error: {str(e)}")
 
+def parse_epoch(value) -> datetime:
+    """Parse an end_epoch value into a naive UTC datetime."""
+    epoch = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    if epoch.tzinfo is not None:
+        epoch = epoch.astimezone(timezone.utc).replace(tzinfo=None)
+    return epoch
+
+def utc_now() -> datetime:
+    """Current time as a naive UTC datetime, comparable with parse_epoch results."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class HourlyVolumeWindow:
+    """Rolling window of hourly query volume per deployment.
+
+    Keeps per-hour counts locally and, on refresh, only fetches hours at or
+    after its high-water mark. The newest hour is fetched again because its
+    rows may still have been arriving. Hours older than the window are
+    evicted, and weekly totals are summed from what is left.
+    """
+
+    def __init__(self, fetch_hours: Callable[[datetime], Iterable[Dict]] = query_hourly_volume, window: timedelta = timedelta(days=7)):
+        self.fetch_hours = fetch_hours
+        self.window = window
+        self.hours: Dict[datetime, Dict[str, Tuple[float, int]]] = {}
+        self.high_water_mark: Optional[datetime] = None
+        self.refreshed_at: Optional[datetime] = None
+        self._totals: Tuple[Dict[str, float], Dict[str, int]] = ({}, {})
+        self._lock = threading.Lock()
+
+    @timed('supabase_api.HourlyVolumeWindow.refresh')
+    def refresh(self, now: Optional[datetime] = None) -> None:
+        """Fetch new hours, evict expired ones and recompute totals."""
+        now = now or utc_now()
+        window_start = now - self.window
+        with self._lock:
+            since = self.high_water_mark if self.high_water_mark is not None else window_start
+
+        # Fetch outside the lock so readers keep getting the current totals.
+        # Rows are folded in as they stream in rather than collected first.
+        fetched: Dict[datetime, Dict[str, Tuple[float, int]]] = {}
+        rows = 0
+        for row in self.fetch_hours(since) or []:
+            rows += 1
+            ipfs_hash = row['subgraph_deployment_ipfs_hash']
+            if ipfs_hash:
+                fetched.setdefault(parse_epoch(row['end_epoch']), {})[ipfs_hash] = (
+                    float(row['total_query_fees']),
+                    int(row['query_count'])
+                )
+
+        counter('supabase_rows_fetched_total', rows)
+
+        with self._lock:
+            # Fetched hours replace what we had for them
+            self.hours.update(fetched)
+            self.hours = {hour: volume for hour, volume in self.hours.items() if hour > window_start}
+            if self.hours:
+                self.high_water_mark = max(self.hours)
+            self.refreshed_at = now
+
+            query_fees: Dict[str, float] = {}
+            query_counts: Dict[str, int] = {}
+            for volume in self.hours.values():
+                for ipfs_hash, (fees, count) in volume.items():
+                    query_fees[ipfs_hash] = query_fees.get(ipfs_hash, 0.0) + fees
+                    query_counts[ipfs_hash] = query_counts.get(ipfs_hash, 0) + count
+            self._totals = (query_fees, query_counts)
+
+    def totals(self) -> Tuple[Dict[str, float], Dict[str, int]]:
+        """Query fees and counts summed over the window, keyed by IPFS hash."""
+        with self._lock:
+            query_fees, query_counts = self._totals
+            return dict(query_fees), dict(query_counts)
+
+    def is_stale(self, max_age: float, now: Optional[datetime] = None) -> bool:
+        """Whether the last refresh is older than `max_age` seconds."""
+        now = now or utc_now()
+        return self.refreshed_at is None or (now - self.refreshed_at).total_seconds() >= max_age
+
+_volume_window = HourlyVolumeWindow()
+
+def fetch_query_data() -> Tuple[Dict[str, float], Dict[str, int]]:
+    """Weekly query fees and counts keyed by IPFS hash, raising on failure.
+
+    Totals come from the process-wide rolling window, which only fetches new
+    hours once its last refresh is QUERY_VOLUME_REFRESH_INTERVAL old.
+    """
+    if _volume_window.is_stale(QUERY_VOLUME_REFRESH_INTERVAL):
+        _volume_window.refresh()
+    return _volume_window.totals()
+
 def process_query_data() -> Tuple[Dict[str, float], Dict[str, int]]:
-    """Process query data from Supabase into fees and counts dictionaries."""
+    """Process query data from Supabase into fees and counts dictionaries.
+
+    If a refresh fails the error is reported and the totals of the last good
+    refresh are returned; they are empty only if no refresh has succeeded.
+    """
     try:
-        rows = query_supabase()
-        
-        # Initialize dictionaries
-        query_fees = {}
-        query_counts = {}
-
-        # Process results
-        if rows:
-            for row in rows:
-                ipfs_hash = row['subgraph_deployment_ipfs_hash']
-                if ipfs_hash:
-                    query_fees[ipfs_hash] = float(row['total_query_fees'])
-                    query_counts[ipfs_hash] = int(row['query_count'])
-
-        return query_fees, query_counts
+        return fetch_query_data()
 
     except Exception as e:
-        st.error(f"Error querying Supabase: {str(e)}")
-        return {}, {}
+        report_error(f"Error querying Supabase: {str(e)}")
+        return _volume_window.totals()
@@ -0,0 +1,51 @@
+from typing import Dict, List, Tuple
+import numpy as np
+
+def generate_network(
+    num_deployments: int,
+    seed: int = 0,
+    queried_fraction: float = 0.6
+) -> Tuple[List[Dict], Dict[str, float], Dict[str, int]]:
+    """Generate a synthetic network shaped like the real one.
+
+    Returns (deployments, query_fees, query_counts) in the same form as
+    get_subgraph_deployments and process_query_data. Signal is log-normal and
+    weekly query counts are Pareto distributed, so a few deployments carry
+    most of the volume. Only `queried_fraction` of deployments have queries.
+    """
+    rng = np.random.default_rng(seed)
+
+    ids = rng.integers(0, 2**63, size=(num_deployments, 4), dtype=np.uint64)
+    signalled_grt = np.maximum(rng.lognormal(mean=9.0, sigma=1.5, size=num_deployments), 101.0)
+    # Curation shares track deposited GRT loosely, as on the bonding curve
+    signal_grt = signalled_grt * rng.uniform(0.2, 1.0, size=num_deployments)
+    weekly_queries = (rng.pareto(1.1, size=num_deployments) * 20000).astype(np.int64)
+    queried = rng.random(num_deployments) < queried_fraction
+
+    deployments = []
+    query_fees = {}
+    query_counts = {}
+    for i in range(num_deployments):
+        ipfs_hash = f"Qm{seed:04d}{i:08d}"
+        deployments.append({
+            'id': '0x' + ''.join(f'{word:016x}' for word in ids[i]),
+            'ipfsHash': ipfs_hash,
+            'signalAmount': str(int(signal_grt[i] * 1e18)),
+            'signalledTokens': str(int(signalled_grt[i] * 1e18)),
+            'stakedTokens': '0',
+            'queryFeesAmount': '0',
+            'queryFeeRebates': '0'
+        })
+        if queried[i]:
+            query_counts[ipfs_hash] = int(weekly_queries[i])
+            query_fees[ipfs_hash] = weekly_queries[i] * 4e-5
+
+    deployments.sort(key=lambda d: d['id'])
+    return deployments, query_fees, query_counts
+
+def generate_user_signals(query_counts: Dict[str, int], num_positions: int, seed: int = 0) -> Dict[str, float]:
+    """Pick existing positions for a synthetic curator among queried deployments."""
+    rng = np.random.default_rng(seed + 1)
+    hashes = sorted(query_counts)
+    chosen = rng.choice(len(hashes), size=min(num_positions, len(hashes)), replace=False)
+    return {hashes[i]: float(rng.uniform(100, 5000)) for i in chosen}
@@ -0,0 +1,179 @@
+"""Benchmark the opportunity and allocation pipeline on synthetic networks.
+
+Usage (from python_app/):
+    python -m benchmarks.run_benchmarks --sizes 1000,10000,100000 --save-baseline
+    python -m benchmarks.run_benchmarks --fail-on-regression
+
+Timings depend on the machine, so they are kept in a local, untracked
+baseline.json. Earnings only depend on the seed, so --save-baseline also
+writes them to reference.json, which is committed: a fresh checkout
+checks allocation quality before it has any timings of its own.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+from benchmarks.generators import generate_network, generate_user_signals
+from models.opportunities import OpportunityTable, calculate_opportunities, calculate_signal_distribution
+from models.signals import calculate_optimal_allocations
+from models.allocation.optimizer import AllocationOptimizer
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_REFERENCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reference.json')
+GRT_PRICE = 0.1
+
+def measure(func: Callable, repeat: int) -> Tuple[object, float, float]:
+    """Run `func`, returning its result, best wall time in seconds and peak traced memory in MB.
+
+    Timing runs are untraced; one extra run under tracemalloc measures memory.
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak / 2**20
+
+def allocation_earnings(table: OpportunityTable, allocations: Dict[str, float]) -> float:
+    """Annual USD earnings of an allocation, x * curator_share / (signalled_tokens + x) per position.
+
+    Every solver is scored with this one formula so their results compare.
+    """
+    total = 0.0
+    for ipfs_hash, amount in allocations.items():
+        index = table.position(ipfs_hash)
+        if index is not None and amount > 0:
+            total += table.curator_share[index] * amount / (table.signalled_tokens[index] + amount)
+    return total
+
+def run_cases(sizes: List[int], balances: List[float], repeat: int, max_greedy_size: int, seed: int) -> List[Dict]:
+    """Run every benchmark case and return one record per case."""
+    records = []
+    for size in sizes:
+        deployments, query_fees, query_counts = generate_network(size, seed=seed)
+        user_signals = generate_user_signals(query_counts, 50, seed=seed)
+
+        table, seconds, peak_mb = measure(
+            lambda: calculate_opportunities(deployments, query_fees, query_counts, GRT_PRICE), repeat
+        )
+        records.append({
+            'case': f'calculate_opportunities/n={size}',
+            'seconds': seconds,
+            'throughput': size / seconds,
+            'peak_mb': peak_mb,
+            'earnings': None
+        })
+
+        for balance in balances:
+            cases = [
+                ('optimize_allocation[water_fill]', lambda: AllocationOptimizer(table, GRT_PRICE).optimize_allocation(
+                    balance, method="water_fill").allocations),
+                ('calculate_signal_distribution', lambda: calculate_signal_distribution(table, balance, GRT_PRICE)),
+                ('calculate_optimal_allocations', lambda: calculate_optimal_allocations(
+                    table, user_signals, balance, GRT_PRICE, 50))
+            ]
+            if size <= max_greedy_size:
+                cases.insert(0, ('optimize_allocation[greedy]', lambda: AllocationOptimizer(table, GRT_PRICE).optimize_allocation(
+                    balance, method="greedy").allocations))
+
+            for name, func in cases:
+                allocations, seconds, peak_mb = measure(func, repeat)
+                records.append({
+                    'case': f'{name}/n={size}/grt={balance:g}',
+                    'seconds': seconds,
+                    'throughput': size / seconds,
+                    'peak_mb': peak_mb,
+                    'earnings': allocation_earnings(table, allocations)
+                })
+    return records
+
+def load_json(path: str) -> Dict[str, Dict]:
+    """Read a baseline or reference file, or nothing if it doesn't exist."""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_json(path: str, cases: Dict[str, Dict]) -> None:
+    with open(path, 'w') as f:
+        json.dump(cases, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def compare(records: List[Dict], baseline: Dict[str, Dict], tolerance: float, reference: Optional[Dict[str, Dict]] = None) -> List[str]:
+    """List regressions: slower than the baseline beyond tolerance, or lower earnings than the reference.
+
+    Earnings are checked against the baseline as well when there is no reference entry for a case.
+    """
+    regressions = []
+    for record in records:
+        base = baseline.get(record['case']) or {}
+        if base.get('seconds') and record['seconds'] > base['seconds'] * (1 + tolerance):
+            regressions.append(f"{record['case']}: {record['seconds']:.4f}s vs baseline {base['seconds']:.4f}s")
+        expected = ((reference or {}).get(record['case']) or base).get('earnings')
+        if expected and record['earnings'] is not None and record['earnings'] < expected * (1 - 1e-6):
+            regressions.append(f"{record['case']}: earnings ${record['earnings']:,.2f} vs reference ${expected:,.2f}")
+    return regressions
+
+def print_report(records: List[Dict], baseline: Dict[str, Dict]) -> None:
+    """Print one line per case with the change in time against the baseline."""
+    print(f"{'case':<62} {'seconds':>10} {'deploy/s':>12} {'peak MB':>9} {'earnings $':>14} {'vs base':>8}")
+    for record in records:
+        base = baseline.get(record['case'])
+        change = f"{record['seconds'] / base['seconds'] - 1:+.0%}" if base else '-'
+        earnings = f"{record['earnings']:,.2f}" if record['earnings'] is not None else '-'
+        print(f"{record['case']:<62} {record['seconds']:>10.4f} {record['throughput']:>12,.0f} "
+              f"{record['peak_mb']:>9.1f} {earnings:>14} {change:>8}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark opportunity and allocation functions.")
+    parser.add_argument('--sizes', default='1000,10000,100000', help="Comma-separated deployment counts")
+    parser.add_argument('--balances', default='10000,1000000', help="Comma-separated GRT balances")
+    parser.add_argument('--repeat', type=int, default=3, help="Timing runs per case (best is kept)")
+    parser.add_argument('--max-greedy-size', type=int, default=10000, help="Skip the greedy optimizer above this size")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH, help="Local baseline JSON file with timings")
+    parser.add_argument('--reference', default=DEFAULT_REFERENCE_PATH, help="Committed JSON file with expected earnings")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline and reference")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed slowdown before flagging a regression")
+    parser.add_argument('--fail-on-regression', action='store_true', help="Exit with status 1 on regressions")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    balances = [float(balance) for balance in args.balances.split(',')]
+
+    baseline = load_json(args.baseline)
+    reference = load_json(args.reference)
+    # Earnings depend on the synthetic network, so only entries recorded with this seed apply
+    expected = {case: entry for case, entry in reference.items() if entry.get('seed') == args.seed}
+
+    records = run_cases(sizes, balances, args.repeat, args.max_greedy_size, args.seed)
+    print_report(records, baseline)
+
+    if args.save_baseline:
+        baseline.update({record['case']: record for record in records})
+        save_json(args.baseline, baseline)
+        reference.update({
+            record['case']: {'earnings': record['earnings'], 'seed': args.seed}
+            for record in records if record['earnings'] is not None
+        })
+        save_json(args.reference, reference)
+        print(f"Baseline saved to {args.baseline}, earnings reference to {args.reference}")
+        return 0
+
+    regressions = compare(records, baseline, args.tolerance, expected)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
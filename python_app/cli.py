@@ -0,0 +1,149 @@
+"""Headless batch optimizer: fetch network data and optimize allocations for wallets.
+
+Usage:
+    python cli.py --wallet 0xabc... --wallet 0xdef... --method water_fill --format csv
+    python cli.py --wallets-file wallets.txt --output allocations.json
+    python cli.py --wallet 0xabc... --method exact --max-positions 20 --position-cost 5
+    python cli.py --wallets-file wallets.txt --top-n 500
+"""
+import argparse
+import csv
+import json
+import logging
+import sys
+from typing import Dict, List, Optional
+from api.graph_api import refresh_deployment_snapshot, get_grt_price, get_account_balances
+from api.supabase_api import fetch_query_data
+from models.opportunities import calculate_opportunities_streaming
+from models.allocation.optimizer import AllocationOptimizer
+from utils.metrics import log_metrics, profiled
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(description="Optimize curation signal allocation for one or many wallets.")
+    parser.add_argument('--wallet', action='append', default=[], help="Wallet address (repeatable)")
+    parser.add_argument('--wallets-file', help="File with one wallet address per line")
+    parser.add_argument('--balance', type=float, help="GRT to allocate per wallet instead of its on-chain balance")
+    parser.add_argument('--method', choices=AllocationOptimizer.METHODS, default="greedy", help="Allocation solver")
+    parser.add_argument('--max-positions', type=int, help="Most positions to open (exact method only)")
+    parser.add_argument('--position-cost', type=float, default=0.0, help="Fixed USD cost charged per opened position")
+    parser.add_argument('--time-budget', type=float, help="Seconds the exact method may search")
+    parser.add_argument('--top-n', type=int, help="Only consider the N opportunities with the best current APR")
+    parser.add_argument('--format', choices=('json', 'csv'), default='json', help="Output format")
+    parser.add_argument('--output', help="Output file (default: stdout)")
+    parser.add_argument('--log-metrics', action='store_true', help="Log timings and counters as JSON when done")
+    return parser.parse_args(argv)
+
+def read_wallets(args: argparse.Namespace) -> List[str]:
+    """Collect wallet addresses from the command line and the wallets file."""
+    wallets = list(args.wallet)
+    if args.wallets_file:
+        with open(args.wallets_file) as f:
+            wallets.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return list(dict.fromkeys(wallet.lower() for wallet in wallets))
+
+def optimize_wallets(
+    wallets: List[str],
+    method: str = "greedy",
+    balance: Optional[float] = None,
+    max_positions: Optional[int] = None,
+    position_cost: float = 0.0,
+    time_budget: Optional[float] = None,
+    top_n: Optional[int] = None
+) -> List[Dict]:
+    """Run fetch -> calculate_opportunities -> AllocationOptimizer for each wallet.
+
+    With `top_n` only that many opportunities, the best by current APR, are
+    kept while deployments stream in, which bounds memory on large networks.
+    """
+    # Raises on a Supabase failure, so a batch run fails instead of optimizing over no volume
+    _, query_counts = fetch_query_data()
+    grt_price = get_grt_price()
+    # Deployments and balances are read at one block so every wallet sees the same network state;
+    # that is the snapshot's block, which may be past the latest one a lagging gateway reports
+    snapshot = refresh_deployment_snapshot()
+    block = snapshot.block_number()
+    # Deployments are joined against query volume page by page instead of loaded whole
+    opportunities = calculate_opportunities_streaming(snapshot.iter_pages(), query_counts, grt_price, top_n)
+    optimizer = AllocationOptimizer(opportunities, grt_price, position_cost=position_cost)
+
+    balances = {wallet: balance for wallet in wallets} if balance is not None else get_account_balances(wallets, block)
+
+    results = []
+    for wallet in wallets:
+        available_grt = balances.get(wallet, 0.0)
+        if available_grt <= 0:
+            result = None
+        else:
+            result = optimizer.optimize_allocation(
+                available_grt, method=method, max_positions=max_positions, time_budget=time_budget
+            )
+        results.append({
+            'wallet': wallet,
+            'available_grt': available_grt,
+            'grt_price': grt_price,
+            'block_number': block,
+            'total_allocated': result.total_allocated if result else 0.0,
+            'expected_apr': result.expected_apr if result else 0.0,
+            'expected_earnings': result.expected_earnings if result else 0.0,
+            'optimality_gap': result.optimality_gap if result else None,
+            'allocations': result.allocations if result else {}
+        })
+    return results
+
+def write_results(results: List[Dict], output_format: str, out) -> None:
+    """Write results as a JSON document or as one CSV row per allocation."""
+    if output_format == 'json':
+        json.dump(results, out, indent=2)
+        out.write('\n')
+        return
+
+    writer = csv.writer(out)
+    writer.writerow(['wallet', 'ipfs_hash', 'allocated_grt', 'available_grt', 'expected_apr', 'expected_earnings'])
+    for result in results:
+        for ipfs_hash, amount in result['allocations'].items():
+            writer.writerow([
+                result['wallet'],
+                ipfs_hash,
+                amount,
+                result['available_grt'],
+                result['expected_apr'],
+                result['expected_earnings']
+            ])
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    args = parse_args(argv)
+    wallets = read_wallets(args)
+    if not wallets:
+        print("No wallets given; use --wallet or --wallets-file", file=sys.stderr)
+        return 2
+
+    try:
+        with profiled('cli'):
+            results = optimize_wallets(
+                wallets,
+                method=args.method,
+                balance=args.balance,
+                max_positions=args.max_positions,
+                position_cost=args.position_cost,
+                time_budget=args.time_budget,
+                top_n=args.top_n
+            )
+    except Exception as e:
+        print(f"Error: {str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        if args.log_metrics:
+            log_metrics()
+
+    if args.output:
+        with open(args.output, 'w', newline='') as out:
+            write_results(results, args.format, out)
+    else:
+        write_results(results, args.format, sys.stdout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import heapq
+import itertools
+import time
+from typing import Optional, Tuple
+import numpy as np
+from models.allocation.water_fill import allocations_at_level, solve_water_level
+
+# Bound improvements below this (in USD per year) don't count as progress
+VALUE_TOLERANCE = 1e-9
+
+def net_returns(curator_shares: np.ndarray, signalled_tokens: np.ndarray, amounts: np.ndarray, unit_cost: float) -> np.ndarray:
+    """Annual earnings less the per-GRT entry cost, curator_share * x / (signalled_tokens + x) - unit_cost * x."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        earnings = np.where(amounts > 0, curator_shares * amounts / (signalled_tokens + amounts), 0.0)
+    return earnings - unit_cost * amounts
+
+class _Problem:
+    """Candidate columns and constraints shared by every branch-and-bound node."""
+
+    def __init__(self, curator_shares, signalled_tokens, budget, unit_cost, cap, position_cost, max_positions):
+        self.curator_shares = curator_shares
+        self.signalled_tokens = signalled_tokens
+        self.budget = budget
+        self.unit_cost = unit_cost
+        self.cap = cap
+        self.position_cost = position_cost
+        self.max_positions = max_positions
+
+        # Best value of each position on its own, ignoring the other positions
+        alone = allocations_at_level(curator_shares, signalled_tokens, 0.0, unit_cost, min(cap, budget))
+        self.standalone = net_returns(curator_shares, signalled_tokens, alone, unit_cost) - position_cost
+
+    def fill(self, members: np.ndarray) -> np.ndarray:
+        """Water-fill the budget over the `members` mask; everything else gets nothing."""
+        amounts = np.zeros(len(members))
+        if members.any():
+            amounts[members], _ = solve_water_level(
+                self.curator_shares[members], self.signalled_tokens[members], self.budget, self.unit_cost, self.cap
+            )
+        return amounts
+
+    def value(self, amounts: np.ndarray) -> float:
+        """Net annual value of an allocation, paying the position cost for every non-empty position."""
+        open_positions = amounts > 0
+        net = net_returns(self.curator_shares, self.signalled_tokens, amounts, self.unit_cost)
+        return float(net[open_positions].sum() - self.position_cost * open_positions.sum())
+
+    def round(self, amounts: np.ndarray) -> Tuple[np.ndarray, float]:
+        """Turn a relaxed allocation into a feasible one.
+
+        Keeps the positions that pay for their position cost, at most
+        max_positions of them, and re-fills the budget over those until no
+        kept position loses money.
+        """
+        members = amounts > 0
+        while True:
+            contribution = net_returns(self.curator_shares, self.signalled_tokens, amounts, self.unit_cost) - self.position_cost
+            keep = members & (contribution > 0)
+            if keep.sum() > self.max_positions:
+                ranked = np.flatnonzero(keep)[np.argsort(-contribution[keep], kind='stable')]
+                keep = np.zeros(len(keep), dtype=bool)
+                keep[ranked[:self.max_positions]] = True
+            if keep.sum() == members.sum() and (amounts[members] > 0).all():
+                return amounts, self.value(amounts)
+            members = keep
+            amounts = self.fill(members)
+
+    def bound(self, included: np.ndarray, undecided: np.ndarray, amounts: np.ndarray) -> float:
+        """Upper bound on any allocation that opens `included` and picks the rest from `undecided`.
+
+        The smaller of two relaxations: the water fill over every allowed
+        position with only the included position costs charged, and each
+        position's standalone best with the budget ignored.
+        """
+        relaxed = self.value(amounts) + self.position_cost * ((amounts > 0) & undecided).sum()
+        relaxed -= self.position_cost * ((amounts == 0) & included).sum()
+
+        slots = self.max_positions - included.sum()
+        optional = np.sort(self.standalone[undecided])[::-1][:slots]
+        separate = self.standalone[included].sum() + optional[optional > 0].sum()
+        return min(relaxed, float(separate))
+
+def solve_exact(
+    curator_shares: np.ndarray,
+    signalled_tokens: np.ndarray,
+    budget: float,
+    unit_cost: float,
+    cap: float,
+    position_cost: float = 0.0,
+    max_positions: Optional[int] = None,
+    time_budget: float = 2.0
+) -> Tuple[np.ndarray, float, float]:
+    """Maximize net earnings with a fixed cost per position and a position limit.
+
+    Best-first branch-and-bound over which positions are open. Each node fixes
+    some positions open or closed and is bounded by a water fill over the
+    rest, so the continuous part is always solved exactly. Stops when the
+    tree is exhausted or after `time_budget` seconds.
+
+    Returns the allocation array, its net annual value, and the optimality
+    gap: the share of the best remaining bound the answer may still be short
+    of, 0.0 when the answer is proven optimal.
+    """
+    n = len(curator_shares)
+    max_positions = n if max_positions is None else max(0, int(max_positions))
+    problem = _Problem(curator_shares, signalled_tokens, budget, unit_cost, cap, position_cost, max_positions)
+    deadline = time.perf_counter() + time_budget
+
+    # A position whose best standalone value can't cover its cost is never worth opening
+    candidates = problem.standalone > 0
+    best_amounts, best_value = np.zeros(n), 0.0
+    if budget <= 0 or max_positions == 0 or not candidates.any():
+        return best_amounts, best_value, 0.0
+
+    counter = itertools.count()
+    heap = []
+
+    def push(included: np.ndarray, undecided: np.ndarray) -> None:
+        """Bound a node, take any feasible answer it yields, and queue it if it can still win."""
+        nonlocal best_amounts, best_value
+        if included.sum() >= max_positions:
+            undecided = np.zeros(n, dtype=bool)
+        amounts = problem.fill(included | undecided)
+        node_bound = problem.bound(included, undecided, amounts)
+        if node_bound <= best_value + VALUE_TOLERANCE:
+            return
+
+        rounded, value = problem.round(amounts)
+        if value > best_value:
+            best_amounts, best_value = rounded, value
+        if node_bound <= best_value + VALUE_TOLERANCE:
+            return
+
+        branch_on = np.where(undecided & (amounts > 0), amounts, -1.0)
+        if branch_on.max() < 0:
+            return  # The relaxation opens nothing undecided, so it is this node's answer
+        heapq.heappush(heap, (-node_bound, next(counter), included, undecided, int(branch_on.argmax())))
+
+    push(np.zeros(n, dtype=bool), candidates)
+    while heap and time.perf_counter() < deadline:
+        negative_bound, _, included, undecided, index = heapq.heappop(heap)
+        if -negative_bound <= best_value + VALUE_TOLERANCE:
+            continue
+        undecided = undecided.copy()
+        undecided[index] = False
+        with_index = included.copy()
+        with_index[index] = True
+        push(with_index, undecided)
+        push(included, undecided)
+
+    open_bound = max([best_value] + [-entry[0] for entry in heap])
+    gap = (open_bound - best_value) / open_bound if open_bound > VALUE_TOLERANCE else 0.0
+    return best_amounts, best_value, max(0.0, gap)
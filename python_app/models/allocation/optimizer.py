@@ -1,7 +1,12 @@
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Sequence
 import numpy as np
-from models.opportunities import Opportunity
+from models.opportunities import Opportunity, OpportunityTable
+from utils.cache import LRUCache, SharedLRUCache
+from utils.metrics import counter, span
+from models.allocation.water_fill import solve_water_level, repair_water_level
+from models.allocation.exact import solve_exact
+from models.allocation.pruning import CandidateFrontier, dominance_threshold, greedy_score_bounds, water_fill_candidates
 
 @dataclass
 class AllocationResult:
@@ -10,6 +15,8 @@ class AllocationResult:
     total_allocated: float
     expected_apr: float
     expected_earnings: float
+    water_level: Optional[float] = None  # Net marginal return of uncapped positions (water-fill only)
+    optimality_gap: Optional[float] = None  # Share of the best bound not proven reachable (exact only)
 
 class AllocationOptimizer:
     """Optimizes allocation of GRT across opportunities."""
@@ -19,10 +26,28 @@ class AllocationOptimizer:
     EARNINGS_PER_100K_QUERIES = 4  # $4 per 100k queries
     STEP_SIZE = 10  # How much to increase allocations each time
     MAX_ITERATIONS = 1000  # Prevent infinite loops
+    MAX_POSITION_PERCENTAGE = 0.10  # No single position above 10% of available GRT
+    METHODS = ("greedy", "water_fill", "exact")
+    EXACT_TIME_BUDGET = 2.0  # Seconds the exact solver may search before returning its best answer
+    APR_CACHE_SIZE = 65536  # Marginal APR evaluations kept per optimize_allocation run
     
-    def __init__(self, opportunities: List[Opportunity], grt_price: float):
-        self.opportunities = opportunities
+    def __init__(self, opportunities: Sequence[Opportunity], grt_price: float, position_cost: float = 0.0):
+        self.table = OpportunityTable.from_opportunities(opportunities)
+        # Row objects for the greedy loop, built from the table on first use
+        self._rows = None if isinstance(opportunities, OpportunityTable) else list(opportunities)
         self.grt_price = grt_price
+        self.position_cost = position_cost  # Fixed USD cost per opened position, on top of the entry cost
+        self._frontier = None  # Pruned greedy candidates, only while optimize_allocation runs
+        self._constants = None  # Per-opportunity APR inputs as flat lists, built once per table
+        self.apr_cache = LRUCache(self.APR_CACHE_SIZE)  # (index, allocation) -> (apr, earnings)
+        self._apr_cache_price = grt_price
+
+    @property
+    def opportunities(self) -> List[Opportunity]:
+        """Opportunities as row objects."""
+        if self._rows is None:
+            self._rows = list(self.table)
+        return self._rows
     
     def calculate_opportunity_apr(self, opp: Opportunity, additional_signal: float) -> tuple:
         """Calculate APR and earnings for an opportunity with additional signal."""
@@ -36,6 +61,10 @@ class AllocationOptimizer:
         # Calculate curator share (10% of total earnings)
         curator_share = total_earnings * self.CURATOR_SHARE
         
+        return self._apr(curator_share, signal_amount, signalled_tokens)
+
+    def _apr(self, curator_share: float, signal_amount: float, signalled_tokens: float) -> tuple:
+        """APR and earnings of a position from its curator share and signal after allocation."""
         # Calculate portion owned
         portion_owned = signal_amount / signalled_tokens if signalled_tokens > 0 else 0
         
@@ -47,24 +76,78 @@ class AllocationOptimizer:
         
         return apr, estimated_earnings
 
+    def _run_constants(self) -> tuple:
+        """IPFS hashes, curator shares, signal amounts and signalled tokens as flat lists.
+
+        Curator shares are derived from query counts exactly as in
+        calculate_opportunity_apr, once per table instead of once per call.
+        """
+        if self._constants is None:
+            curator_shares = (self.table.annual_queries / 100000) * self.EARNINGS_PER_100K_QUERIES * self.CURATOR_SHARE
+            self._constants = (
+                self.table.ipfs_hash.tolist(),
+                curator_shares.tolist(),
+                self.table.signal_amount.tolist(),
+                self.table.signalled_tokens.tolist()
+            )
+        return self._constants
+
+    def _marginal_apr(self, index: int, allocation: float) -> tuple:
+        """APR and earnings of the opportunity at `index` with `allocation` added, memoized.
+
+        The cache is dropped whenever grt_price has changed since it was filled,
+        so every caller sees APRs at the current price.
+        """
+        if self._apr_cache_price != self.grt_price:
+            self._reset_run_caches()
+        key = (index, allocation)
+        metrics = self.apr_cache.get(key)
+        if metrics is None:
+            _, curator_shares, signal_amounts, signalled_tokens = self._run_constants()
+            metrics = self._apr(curator_shares[index], signal_amounts[index] + allocation, signalled_tokens[index] + allocation)
+            self.apr_cache.put(key, metrics)
+        return metrics
+
+    def _reset_run_caches(self, table_changed: bool = False) -> None:
+        """Start a fresh APR cache, and rebuild the constants if the table changed."""
+        if table_changed:
+            self._constants = None
+        self.apr_cache.clear()
+        self._apr_cache_price = self.grt_price
+
     def find_best_opportunity(self, current_allocations: Dict[str, float], step_size: float) -> tuple:
-        """Find the best opportunity for the next allocation step."""
+        """Find the best opportunity for the next allocation step.
+
+        During optimize_allocation only the candidate frontier is scanned; it
+        widens until nothing outside it could beat the best score found.
+        """
+        if self._frontier is None:
+            best_index, best_metrics = self._scan(range(len(self.table)), current_allocations, step_size)
+        else:
+            while True:
+                best_index, best_metrics = self._scan(self._frontier.indices(), current_allocations, step_size)
+                if self._frontier.covers(best_metrics[0] if best_metrics else -1):
+                    break
+                self._frontier.grow()
+        return (self.table.row(best_index) if best_index is not None else None), best_metrics
+
+    def _scan(self, indices: Sequence[int], current_allocations: Dict[str, float], step_size: float) -> tuple:
+        """Index and metrics of the best opportunity among `indices`, first in order on ties."""
         best_apr = -1
-        best_opp = None
+        best_index = None
         best_metrics = None
+        ipfs_hashes = self._run_constants()[0]
+        max_position = self.total_grt * self.MAX_POSITION_PERCENTAGE
         
-        for opp in self.opportunities:
-            current_allocation = current_allocations.get(opp.ipfs_hash, 0)
+        for index in indices:
+            current_allocation = current_allocations.get(ipfs_hashes[index], 0)
             
             # Skip if we've hit the 10% limit
-            if current_allocation >= self.total_grt * 0.10:
+            if current_allocation >= max_position:
                 continue
             
             # Calculate APR with additional step_size allocation
-            apr, earnings = self.calculate_opportunity_apr(
-                opp,
-                current_allocation + step_size
-            )
+            apr, earnings = self._marginal_apr(index, current_allocation + step_size)
             
             # Consider entry cost if this is a new position
             if current_allocation == 0:
@@ -72,10 +155,10 @@ class AllocationOptimizer:
             
             if apr > best_apr:
                 best_apr = apr
-                best_opp = opp
+                best_index = index
                 best_metrics = (apr, earnings)
         
-        return best_opp, best_metrics
+        return best_index, best_metrics
 
     def calculate_portfolio_metrics(self, allocations: Dict[str, float]) -> tuple:
         """Calculate portfolio-wide metrics."""
@@ -85,33 +168,103 @@ class AllocationOptimizer:
         if total_allocated == 0:
             return 0, 0
         
-        # Calculate entry costs
+        # Calculate entry costs: a share of every GRT signalled, plus a fixed cost per position
         active_positions = len([v for v in allocations.values() if v > 0])
-        total_entry_cost = total_allocated * self.ENTRY_COST_PERCENTAGE * active_positions
+        total_entry_cost = total_allocated * self.ENTRY_COST_PERCENTAGE
         
-        # Calculate earnings for each position
+        # Calculate earnings for each position, in opportunity order
+        positions = sorted(
+            index for index in (self.table.position(ipfs_hash) for ipfs_hash, v in allocations.items() if v > 0)
+            if index is not None
+        )
+        ipfs_hashes = self._run_constants()[0]
         position_aprs = []
-        for opp in self.opportunities:
-            allocation = allocations.get(opp.ipfs_hash, 0)
-            if allocation > 0:
-                apr, earnings = self.calculate_opportunity_apr(opp, allocation)
-                total_earnings += earnings
-                position_aprs.append(apr)
+        for index in positions:
+            apr, earnings = self._marginal_apr(index, allocations[ipfs_hashes[index]])
+            total_earnings += earnings
+            position_aprs.append(apr)
         
         # Subtract entry costs from earnings
-        net_earnings = total_earnings - (total_entry_cost * self.grt_price)
+        net_earnings = total_earnings - (total_entry_cost * self.grt_price) - self.position_cost * active_positions
         
         # Calculate average APR
         portfolio_apr = sum(position_aprs) / len(position_aprs) if position_aprs else 0
         
         return net_earnings, portfolio_apr
 
-    def optimize_allocation(self, available_grt: float) -> AllocationResult:
-        """Optimize GRT allocation using iterative approach."""
+    def optimize_allocation(
+        self,
+        available_grt: float,
+        method: str = "greedy",
+        max_positions: Optional[int] = None,
+        time_budget: Optional[float] = None
+    ) -> AllocationResult:
+        """Optimize GRT allocation.
+
+        `method` selects the solver: "greedy" hands out STEP_SIZE chunks to the
+        best opportunity one at a time, "water_fill" equalizes marginal returns
+        in closed form, and "exact" also charges `position_cost` per position
+        and opens at most `max_positions`, searching for up to `time_budget`
+        seconds (EXACT_TIME_BUDGET by default).
+        """
         if available_grt <= 0:
             raise Exception("Available GRT must be greater than 0")
+        if method not in self.METHODS:
+            raise Exception(f"Unknown allocation method: {method}")
+        if max_positions is not None and method != "exact":
+            raise Exception("max_positions is only supported by the exact method")
         
         self.total_grt = available_grt  # Store for 10% limit check
+        self._reset_run_caches()
+        with span(f"optimizer.optimize_allocation[{method}]"):
+            try:
+                if method == "water_fill":
+                    return self._optimize_water_fill(available_grt)
+                if method == "exact":
+                    return self._optimize_exact(available_grt, max_positions, time_budget)
+                return self._optimize_greedy(available_grt)
+            finally:
+                counter('apr_evaluations_total', self.apr_cache.misses)
+                counter('apr_cache_hits_total', self.apr_cache.hits)
+
+    def _optimize_greedy(self, available_grt: float) -> AllocationResult:
+        """Optimize GRT allocation one STEP_SIZE chunk at a time over the pruned frontier."""
+        self._frontier = self._greedy_frontier(available_grt)
+        try:
+            allocations = self._allocate_greedily(available_grt)
+        finally:
+            self._frontier = None
+        
+        # Calculate final metrics
+        earnings, apr = self.calculate_portfolio_metrics(allocations)
+        
+        return AllocationResult(
+            allocations=allocations,
+            total_allocated=float(sum(allocations.values())),
+            expected_apr=apr,
+            expected_earnings=earnings
+        )
+
+    def _greedy_frontier(self, available_grt: float) -> CandidateFrontier:
+        """Drop opportunities the greedy loop can never pick and order the rest.
+
+        An opportunity is dropped if even its first step can't beat the loop's
+        -1 starting score, or can't beat the score that enough other positions
+        keep until they are full to take the whole budget.
+        """
+        cap = available_grt * self.MAX_POSITION_PERCENTAGE
+        # Same earnings as calculate_opportunity_apr, which works from query counts
+        curator_shares = (self.table.annual_queries / 100000) * self.EARNINGS_PER_100K_QUERIES * self.CURATOR_SHARE
+        upper, floor = greedy_score_bounds(
+            curator_shares, self.table.signalled_tokens, self.grt_price, cap, self.STEP_SIZE,
+            self.ENTRY_COST_PERCENTAGE * 100
+        )
+        threshold = max(-1, dominance_threshold(floor, available_grt, cap))
+        candidates = np.flatnonzero((upper > -1) & (upper >= threshold))
+        return CandidateFrontier(upper, candidates)
+
+    def _allocate_greedily(self, available_grt: float) -> Dict[str, float]:
+        """Hand out STEP_SIZE chunks to the best opportunity one at a time."""
         allocations = {}
         remaining_grt = available_grt
         iterations = 0
@@ -139,7 +292,7 @@ class AllocationOptimizer:
             # Calculate how much we can allocate
             current_allocation = allocations.get(best_opp.ipfs_hash, 0)
             max_allocation = min(
-                self.total_grt * 0.10,  # 10% limit
+                self.total_grt * self.MAX_POSITION_PERCENTAGE,  # 10% limit
                 remaining_grt  # Can't allocate more than we have
             )
             space_available = max_allocation - current_allocation
@@ -165,12 +318,137 @@ class AllocationOptimizer:
             if not made_progress and current_step <= 10:
                 break
         
+        counter('optimizer_iterations_total', iterations)
+        return allocations
+
+    def _optimize_water_fill(self, available_grt: float) -> AllocationResult:
+        """Optimize GRT allocation by equalizing marginal returns in O(n log n).
+
+        Positions that provably stay empty are dropped before solving.
+        """
+        cap = available_grt * self.MAX_POSITION_PERCENTAGE
+        candidates = water_fill_candidates(
+            self.table.curator_share, self.table.signalled_tokens, available_grt, self._unit_cost(), cap
+        )
+        amounts = np.zeros(len(self.table))
+        amounts[candidates], level = solve_water_level(
+            self.table.curator_share[candidates],
+            self.table.signalled_tokens[candidates],
+            available_grt,
+            self._unit_cost(),
+            cap
+        )
+        return self._water_fill_result(amounts, level)
+
+    def _optimize_exact(self, available_grt: float, max_positions: Optional[int], time_budget: Optional[float]) -> AllocationResult:
+        """Optimize GRT allocation by branch-and-bound over which positions to open."""
+        amounts, _, gap = solve_exact(
+            self.table.curator_share,
+            self.table.signalled_tokens,
+            available_grt,
+            self._unit_cost(),
+            available_grt * self.MAX_POSITION_PERCENTAGE,
+            position_cost=self.position_cost,
+            max_positions=max_positions,
+            time_budget=self.EXACT_TIME_BUDGET if time_budget is None else time_budget
+        )
+        result = self._water_fill_result(amounts, None)
+        result.optimality_gap = gap
+        return result
+
+    def reoptimize_allocation(
+        self,
+        previous: AllocationResult,
+        changed: Sequence[Opportunity],
+        available_grt: float
+    ) -> AllocationResult:
+        """Update a previous water-fill result after some opportunities changed.
+
+        `changed` holds new versions of existing opportunities (matched by IPFS
+        hash) and any new ones. The optimizer's opportunities are updated, then
+        the previous solution is repaired locally. Falls back to a full solve
+        if the previous result was not a water-fill result from this optimizer
+        with the same budget, or if the repair would move an empty or capped
+        position.
+        """
+        self.table, changed_rows = self.table.with_updates(changed)
+        self._reset_run_caches(table_changed=True)
+        if self._rows is not None:
+            for index in np.flatnonzero(changed_rows):
+                if index < len(self._rows):
+                    self._rows[index] = self.table.row(index)
+                else:
+                    self._rows.append(self.table.row(index))
+
+        if previous.water_level is None or getattr(self, 'total_grt', None) != available_grt:
+            return self.optimize_allocation(available_grt, method="water_fill")
+
+        previous_amounts = np.zeros(len(self.table))
+        for ipfs_hash, amount in previous.allocations.items():
+            index = self.table.position(ipfs_hash)
+            if index is not None:
+                previous_amounts[index] = amount
+
+        repaired = repair_water_level(
+            self.table.curator_share,
+            self.table.signalled_tokens,
+            previous_amounts,
+            changed_rows,
+            available_grt,
+            self._unit_cost(),
+            available_grt * self.MAX_POSITION_PERCENTAGE
+        )
+        if repaired is None:
+            return self.optimize_allocation(available_grt, method="water_fill")
+        return self._water_fill_result(*repaired)
+
+    def _unit_cost(self) -> float:
+        """Entry cost per GRT in USD.
+
+        Entry cost is charged on every GRT signalled, so it lowers the net
+        marginal return of each position by the same amount.
+        """
+        return self.ENTRY_COST_PERCENTAGE * self.grt_price
+
+    def _water_fill_result(self, amounts: np.ndarray, level: Optional[float]) -> AllocationResult:
+        """Build an AllocationResult from a water-fill allocation array."""
+        allocations = {
+            self.table.ipfs_hash[index]: float(amounts[index])
+            for index in np.flatnonzero(amounts > 0)
+        }
+
         # Calculate final metrics
         earnings, apr = self.calculate_portfolio_metrics(allocations)
-        
+
         return AllocationResult(
             allocations=allocations,
             total_allocated=float(sum(allocations.values())),
             expected_apr=apr,
-            expected_earnings=earnings
+            expected_earnings=earnings,
+            water_level=level
+        )
+
+def optimize_cached(
+    cache: SharedLRUCache,
+    snapshot_id: str,
+    wallet: str,
+    opportunities: Sequence[Opportunity],
+    grt_price: float,
+    available_grt: float,
+    method: str = "greedy",
+    max_positions: Optional[int] = None,
+    position_cost: float = 0.0,
+    time_budget: Optional[float] = None
+) -> AllocationResult:
+    """Optimize through `cache`, keyed on the snapshot id, wallet, balance and solver parameters.
+
+    `snapshot_id` must identify `opportunities` and `grt_price`. Cached
+    results are shared between callers, so treat them as read-only.
+    """
+    key = (snapshot_id, wallet, available_grt, method, max_positions, position_cost, time_budget)
+    return cache.get_or_compute(
+        key,
+        lambda: AllocationOptimizer(opportunities, grt_price, position_cost=position_cost).optimize_allocation(
+            available_grt, method=method, max_positions=max_positions, time_budget=time_budget
         )
+    )
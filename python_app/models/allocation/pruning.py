@@ -0,0 +1,95 @@
+import math
+from typing import List, Tuple
+import numpy as np
+
+# Safety margin so float rounding in the exact APR can't undercut a bound
+BOUND_MARGIN = 1e-9
+
+def dominance_threshold(floors: np.ndarray, budget: float, cap: float) -> float:
+    """Score that enough positions are guaranteed to beat to absorb the whole budget.
+
+    If at least ceil(budget / cap) positions always score above T until they
+    hit the cap, they can take the entire budget between them, so a candidate
+    that can never score above T never gets anything. An unbounded budget
+    can't be absorbed, so nothing is pruned.
+    """
+    if not math.isfinite(budget):
+        return -math.inf
+    needed = math.ceil(budget / cap) if cap > 0 else len(floors) + 1
+    if needed > len(floors):
+        return -math.inf
+    return float(np.partition(floors, len(floors) - needed)[len(floors) - needed])
+
+def greedy_score_bounds(
+    curator_shares: np.ndarray,
+    signalled_tokens: np.ndarray,
+    grt_price: float,
+    cap: float,
+    step: float,
+    entry_penalty: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Bounds on the greedy loop's per-step score for every opportunity.
+
+    The greedy score is the APR after adding a step, 100 * curator_share /
+    ((signalled_tokens + allocation) * grt_price), less the entry penalty for
+    a new position. It only falls as allocation grows. Returns (upper, floor):
+    `upper` is the score of a first pick as the step goes to zero, and `floor`
+    is the lowest score while the position is still under the cap.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        upper = np.where(
+            signalled_tokens > 0,
+            100 * curator_shares / (signalled_tokens * grt_price),
+            np.inf
+        ) - entry_penalty
+        floor = 100 * curator_shares / ((signalled_tokens + cap + step) * grt_price) - entry_penalty
+    return upper + np.abs(upper) * BOUND_MARGIN, floor - np.abs(floor) * BOUND_MARGIN
+
+def water_fill_candidates(
+    curator_shares: np.ndarray,
+    signalled_tokens: np.ndarray,
+    budget: float,
+    unit_cost: float,
+    cap: float
+) -> np.ndarray:
+    """Indices of positions that can receive anything in the water-fill solution.
+
+    A position gets nothing if its net marginal return at zero can't beat the
+    entry cost, or can't beat the water level. The level is at least the net
+    marginal return at the cap of the positions that would fill the budget.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        at_zero = np.where(signalled_tokens > 0, curator_shares / signalled_tokens, 0.0) - unit_cost
+        at_cap = curator_shares * signalled_tokens / (signalled_tokens + cap) ** 2 - unit_cost
+    # Demand strictly more than the budget, so the bisection takes the same path without them
+    level_floor = max(0.0, dominance_threshold(at_cap, budget * (1 + BOUND_MARGIN), cap))
+    return np.flatnonzero(at_zero > level_floor * (1 + BOUND_MARGIN))
+
+class CandidateFrontier:
+    """Greedy candidates ordered by score upper bound, widened only when needed.
+
+    Only the first `size` candidates by upper bound are scanned. If the best
+    score among them doesn't strictly beat the next excluded upper bound, an
+    excluded candidate might win, so the frontier doubles and the scan repeats.
+    """
+
+    def __init__(self, upper: np.ndarray, candidates: np.ndarray, initial_size: int = 64):
+        self.order = candidates[np.argsort(-upper[candidates], kind='stable')]
+        self.upper = upper[self.order]
+        self.size = min(initial_size, len(self.order))
+        self._indices = None
+
+    def indices(self) -> List[int]:
+        """Frontier positions in their original order, so ties break as in a full scan."""
+        if self._indices is None:
+            self._indices = np.sort(self.order[:self.size]).tolist()
+        return self._indices
+
+    def covers(self, best_score: float) -> bool:
+        """Whether no excluded candidate can reach `best_score`."""
+        return self.size >= len(self.order) or best_score > self.upper[self.size]
+
+    def grow(self) -> None:
+        """Double the frontier."""
+        self.size = min(len(self.order), max(1, self.size * 2))
+        self._indices = None
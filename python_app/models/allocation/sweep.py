@@ -0,0 +1,118 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+from models.opportunities import Opportunity, OpportunityTable
+from models.allocation.optimizer import AllocationOptimizer
+
+FLOAT_COLUMNS = ('signal_amount', 'signalled_tokens', 'total_earnings', 'curator_share', 'estimated_earnings', 'apr')
+INT_COLUMNS = ('annual_queries', 'weekly_queries')
+
+# Per-worker state, set once by the pool initializer
+_worker_segments: List[shared_memory.SharedMemory] = []
+_worker_optimizer: Optional[AllocationOptimizer] = None
+
+def _share(table: OpportunityTable, columns: Tuple[str, ...], dtype) -> shared_memory.SharedMemory:
+    """Copy `columns` of the table into a new shared memory block, one row per column."""
+    n = len(table)
+    segment = shared_memory.SharedMemory(create=True, size=max(1, len(columns) * n * np.dtype(dtype).itemsize))
+    block = np.ndarray((len(columns), n), dtype=dtype, buffer=segment.buf)
+    for i, column in enumerate(columns):
+        block[i] = getattr(table, column)
+    return segment
+
+def _attach(float_name: str, int_name: str, n: int) -> None:
+    """Pool initializer: map the shared columns and build this worker's optimizer.
+
+    Columns are NumPy views over the shared blocks, so nothing is copied or
+    unpickled per task. Rows are keyed by index; IPFS hashes stay in the parent.
+    """
+    global _worker_optimizer
+    float_segment = shared_memory.SharedMemory(name=float_name)
+    int_segment = shared_memory.SharedMemory(name=int_name)
+    _worker_segments.extend([float_segment, int_segment])
+    floats = np.ndarray((len(FLOAT_COLUMNS), n), dtype=np.float64, buffer=float_segment.buf)
+    ints = np.ndarray((len(INT_COLUMNS), n), dtype=np.int64, buffer=int_segment.buf)
+
+    columns = {column: floats[i] for i, column in enumerate(FLOAT_COLUMNS)}
+    columns.update({column: ints[i] for i, column in enumerate(INT_COLUMNS)})
+    _worker_optimizer = _index_keyed_optimizer(columns, n)
+
+def _index_keyed_optimizer(columns: Dict[str, np.ndarray], n: int) -> AllocationOptimizer:
+    """Build an optimizer over numeric columns, with row indices standing in for IPFS hashes."""
+    return AllocationOptimizer(OpportunityTable(ipfs_hash=np.arange(n), **columns), 0.0)
+
+def _run_price(grt_price: float, budgets: Sequence[float], method: str) -> List[Dict]:
+    """Optimize every budget at one GRT price in this worker."""
+    return _optimize_budgets(_worker_optimizer, grt_price, budgets, method)
+
+def _optimize_budgets(optimizer: AllocationOptimizer, grt_price: float, budgets: Sequence[float], method: str) -> List[Dict]:
+    """Optimize every budget at one GRT price."""
+    optimizer.grt_price = grt_price
+    rows = []
+    for budget in budgets:
+        result = optimizer.optimize_allocation(budget, method=method)
+        rows.append({
+            'grt_price': grt_price,
+            'available_grt': budget,
+            'total_allocated': result.total_allocated,
+            'expected_apr': result.expected_apr,
+            'expected_earnings': result.expected_earnings,
+            'positions': len(result.allocations),
+            'allocations': result.allocations
+        })
+    return rows
+
+def sweep_scenarios(
+    opportunities: Sequence[Opportunity],
+    grt_prices: Sequence[float],
+    budgets: Sequence[float],
+    method: str = "water_fill",
+    max_workers: Optional[int] = None,
+    include_allocations: bool = False
+) -> pd.DataFrame:
+    """Run the optimizer over every (GRT price, budget) pair on a process pool.
+
+    The opportunity columns are published once in shared memory and every
+    worker maps them on start-up. Each task is one price with all budgets.
+    Returns one row per scenario, sorted by price then budget. With
+    `include_allocations`, an `allocations` column maps IPFS hash to GRT.
+    """
+    if method not in AllocationOptimizer.METHODS:
+        raise Exception(f"Unknown allocation method: {method}")
+    table = OpportunityTable.from_opportunities(opportunities)
+    max_workers = max_workers or os.cpu_count() or 1
+    budgets = list(budgets)
+
+    if max_workers <= 1:
+        # Run in this process on the table's own columns
+        optimizer = _index_keyed_optimizer(
+            {column: getattr(table, column) for column in FLOAT_COLUMNS + INT_COLUMNS},
+            len(table)
+        )
+        batches = [_optimize_budgets(optimizer, price, budgets, method) for price in grt_prices]
+    else:
+        float_segment = _share(table, FLOAT_COLUMNS, np.float64)
+        int_segment = _share(table, INT_COLUMNS, np.int64)
+        try:
+            initargs = (float_segment.name, int_segment.name, len(table))
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach, initargs=initargs) as executor:
+                batches = list(executor.map(_run_price, grt_prices, [budgets] * len(grt_prices), [method] * len(grt_prices)))
+        finally:
+            for segment in (float_segment, int_segment):
+                segment.close()
+                segment.unlink()
+
+    rows = [row for batch in batches for row in batch]
+    for row in rows:
+        if include_allocations:
+            row['allocations'] = {table.ipfs_hash[index]: amount for index, amount in row['allocations'].items()}
+        else:
+            del row['allocations']
+
+    frame = pd.DataFrame(rows, columns=[
+        'grt_price', 'available_grt', 'total_allocated', 'expected_apr', 'expected_earnings', 'positions'
+    ] + (['allocations'] if include_allocations else []))
+    return frame.sort_values(['grt_price', 'available_grt'], ignore_index=True)
@@ -0,0 +1,97 @@
+from typing import Optional, Tuple
+import numpy as np
+
+BISECTION_ITERATIONS = 100  # Enough to pin the water level to float precision
+
+def allocations_at_level(
+    curator_shares: np.ndarray,
+    signalled_tokens: np.ndarray,
+    level: float,
+    unit_cost: float,
+    cap: float
+) -> np.ndarray:
+    """Allocation per opportunity whose net marginal return equals `level`.
+
+    A position of x GRT earns curator_share * x / (signalled_tokens + x) per
+    year, so its marginal return is curator_share * signalled_tokens /
+    (signalled_tokens + x) ** 2. Solving marginal - unit_cost = level for x
+    gives the closed form below, clipped to [0, cap].
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        target = np.sqrt(curator_shares * signalled_tokens / (level + unit_cost)) - signalled_tokens
+    target = np.nan_to_num(target, nan=0.0, posinf=cap, neginf=0.0)
+    return np.clip(target, 0.0, cap)
+
+def solve_water_level(
+    curator_shares: np.ndarray,
+    signalled_tokens: np.ndarray,
+    budget: float,
+    unit_cost: float,
+    cap: float
+) -> Tuple[np.ndarray, float]:
+    """Equalize net marginal returns across opportunities within a budget.
+
+    Bisects on the Lagrange multiplier of the budget constraint. Returns the
+    allocation array and the water level (net marginal return, in USD per GRT
+    per year, shared by every position that is neither empty nor capped).
+    """
+    if len(curator_shares) == 0 or budget <= 0:
+        return np.zeros(len(curator_shares)), 0.0
+
+    # If every profitable position can be filled without exhausting the budget,
+    # spending more would only buy negative net returns
+    unconstrained = allocations_at_level(curator_shares, signalled_tokens, 0.0, unit_cost, cap)
+    if unconstrained.sum() <= budget:
+        return unconstrained, 0.0
+
+    # Highest possible net marginal return is at zero allocation
+    with np.errstate(divide='ignore', invalid='ignore'):
+        marginal_at_zero = np.where(signalled_tokens > 0, curator_shares / signalled_tokens, 0.0)
+    low, high = 0.0, float(marginal_at_zero.max())
+
+    for _ in range(BISECTION_ITERATIONS):
+        mid = (low + high) / 2
+        if allocations_at_level(curator_shares, signalled_tokens, mid, unit_cost, cap).sum() > budget:
+            low = mid
+        else:
+            high = mid
+
+    # `high` is the feasible side of the bracket
+    return allocations_at_level(curator_shares, signalled_tokens, high, unit_cost, cap), high
+
+def repair_water_level(
+    curator_shares: np.ndarray,
+    signalled_tokens: np.ndarray,
+    previous: np.ndarray,
+    changed: np.ndarray,
+    budget: float,
+    unit_cost: float,
+    cap: float
+) -> Optional[Tuple[np.ndarray, float]]:
+    """Re-balance a previous water-fill solution after a few opportunities changed.
+
+    Only changed positions and positions strictly between empty and capped
+    respond continuously to the water level, so the level is re-solved over
+    just those. Empty and capped positions are kept as they were, provided
+    the new level leaves them where they are. Returns None when it doesn't,
+    and the caller has to solve from scratch.
+    """
+    active = changed | ((previous > 0) & (previous < cap))
+    pinned_total = previous[~active].sum()
+
+    active_amounts, level = solve_water_level(
+        curator_shares[active],
+        signalled_tokens[active],
+        budget - pinned_total,
+        unit_cost,
+        cap
+    )
+
+    pinned = ~active
+    at_level = allocations_at_level(curator_shares[pinned], signalled_tokens[pinned], level, unit_cost, cap)
+    if not np.allclose(at_level, previous[pinned], rtol=0.0, atol=1e-9):
+        return None
+
+    amounts = previous.copy()
+    amounts[active] = active_amounts
+    return amounts, level
@@ -1,5 +1,8 @@
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 from dataclasses import dataclass
+import heapq
+import numpy as np
+from utils.metrics import timed
 
 @dataclass
 class Opportunity:
@@ -14,99 +17,275 @@ class Opportunity:
     apr: float
     weekly_queries: int
 
+class OpportunityTable:
+    """Columnar table of curation opportunities backed by NumPy arrays.
+
+    Iterating or indexing with an integer yields `Opportunity` row views, so
+    code written against a list of opportunities keeps working unchanged.
+    """
+
+    COLUMNS = (
+        'ipfs_hash', 'signal_amount', 'signalled_tokens', 'annual_queries', 'total_earnings',
+        'curator_share', 'estimated_earnings', 'apr', 'weekly_queries'
+    )
+
+    def __init__(
+        self,
+        ipfs_hash: np.ndarray,
+        signal_amount: np.ndarray,
+        signalled_tokens: np.ndarray,
+        annual_queries: np.ndarray,
+        total_earnings: np.ndarray,
+        curator_share: np.ndarray,
+        estimated_earnings: np.ndarray,
+        apr: np.ndarray,
+        weekly_queries: np.ndarray
+    ):
+        if isinstance(ipfs_hash, np.ndarray) and ipfs_hash.dtype.kind == 'U':
+            self.ipfs_hash = ipfs_hash  # Fixed-width strings, e.g. memory-mapped from a snapshot file
+        else:
+            self.ipfs_hash = np.asarray(ipfs_hash, dtype=object)
+        self.signal_amount = np.asarray(signal_amount, dtype=float)
+        self.signalled_tokens = np.asarray(signalled_tokens, dtype=float)
+        self.annual_queries = np.asarray(annual_queries, dtype=np.int64)
+        self.total_earnings = np.asarray(total_earnings, dtype=float)
+        self.curator_share = np.asarray(curator_share, dtype=float)
+        self.estimated_earnings = np.asarray(estimated_earnings, dtype=float)
+        self.apr = np.asarray(apr, dtype=float)
+        self.weekly_queries = np.asarray(weekly_queries, dtype=np.int64)
+        self._positions: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_opportunities(cls, opportunities: Sequence[Opportunity]) -> 'OpportunityTable':
+        """Build a table from Opportunity objects, or return an existing table as is."""
+        if isinstance(opportunities, cls):
+            return opportunities
+        return cls(**{
+            column: [getattr(opp, column) for opp in opportunities]
+            for column in cls.COLUMNS
+        })
+
+    @classmethod
+    def concat(cls, tables: Sequence['OpportunityTable']) -> 'OpportunityTable':
+        """Stack tables row-wise, in order."""
+        if not tables:
+            return cls.from_opportunities([])
+        return cls(**{column: np.concatenate([getattr(table, column) for table in tables]) for column in cls.COLUMNS})
+
+    def __len__(self) -> int:
+        return len(self.ipfs_hash)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.row(int(key))
+        return self.take(key)
+
+    def __iter__(self) -> Iterator[Opportunity]:
+        for index in range(len(self)):
+            yield self.row(index)
+
+    def row(self, index: int) -> Opportunity:
+        """Return a single row as an Opportunity."""
+        return Opportunity(
+            ipfs_hash=self.ipfs_hash[index],
+            signal_amount=float(self.signal_amount[index]),
+            signalled_tokens=float(self.signalled_tokens[index]),
+            annual_queries=int(self.annual_queries[index]),
+            total_earnings=float(self.total_earnings[index]),
+            curator_share=float(self.curator_share[index]),
+            estimated_earnings=float(self.estimated_earnings[index]),
+            apr=float(self.apr[index]),
+            weekly_queries=int(self.weekly_queries[index])
+        )
+
+    def take(self, indices) -> 'OpportunityTable':
+        """Return a new table with the selected rows (index array, mask or slice)."""
+        return OpportunityTable(**{column: getattr(self, column)[indices] for column in self.COLUMNS})
+
+    def position(self, ipfs_hash: str) -> Optional[int]:
+        """Row index of an IPFS hash, or None if it is not in the table."""
+        if self._positions is None:
+            self._positions = {h: i for i, h in enumerate(self.ipfs_hash)}
+        return self._positions.get(ipfs_hash)
+
+    def with_updates(self, changes: Sequence[Opportunity]) -> Tuple['OpportunityTable', np.ndarray]:
+        """Return a copy with rows replaced, or appended, by IPFS hash.
+
+        Also returns a boolean mask over the new table marking the changed rows.
+        """
+        changes = OpportunityTable.from_opportunities(changes)
+        rows = [self.position(ipfs_hash) for ipfs_hash in changes.ipfs_hash]
+        existing = np.array([row is not None for row in rows], dtype=bool)
+        replaced_rows = np.array([row for row in rows if row is not None], dtype=np.int64)
+        added = changes.take(~existing)
+
+        columns = {}
+        for column in self.COLUMNS:
+            values = getattr(self, column).copy()
+            values[replaced_rows] = getattr(changes, column)[existing]
+            columns[column] = np.concatenate([values, getattr(added, column)])
+        updated = OpportunityTable(**columns)
+
+        changed = np.zeros(len(updated), dtype=bool)
+        changed[replaced_rows] = True
+        changed[len(self):] = True
+        return updated, changed
+
+    def portion_owned(self, additional_signal=0.0) -> np.ndarray:
+        """Portion owned per opportunity after adding signal."""
+        signal_amount = self.signal_amount + additional_signal
+        signalled_tokens = self.signalled_tokens + additional_signal
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(signalled_tokens > 0, signal_amount / signalled_tokens, 0.0)
+
+    def earnings(self, additional_signal=0.0) -> np.ndarray:
+        """Estimated annual earnings per opportunity after adding signal."""
+        return self.curator_share * self.portion_owned(additional_signal)
+
+    def apr_with(self, grt_price: float, additional_signal=0.0) -> np.ndarray:
+        """APR per opportunity after adding signal."""
+        signal_amount = self.signal_amount + additional_signal
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(
+                signal_amount > 0,
+                (self.earnings(additional_signal) / (signal_amount * grt_price)) * 100,
+                0.0
+            )
+
+def opportunity_rows(
+    deployments: List[Dict],
+    query_counts: Dict[str, int],
+    grt_price: float
+) -> OpportunityTable:
+    """Opportunities for a batch of raw deployments, in input order and unsorted."""
+    # Only deployments with query volume are opportunities
+    deployments = [d for d in deployments if d['ipfsHash'] in query_counts]
+
+    ipfs_hash = np.array([d['ipfsHash'] for d in deployments], dtype=object)
+    signal_amount = np.array([d['signalAmount'] for d in deployments], dtype=float) / 1e18  # Convert wei to GRT
+    signalled_tokens = np.array([d['signalledTokens'] for d in deployments], dtype=float) / 1e18  # Convert wei to GRT
+    weekly_queries = np.array([query_counts[h] for h in ipfs_hash], dtype=np.int64)
+    annual_queries = weekly_queries * 52  # Annualize the queries
+
+    # Calculate total earnings based on $4 per 100,000 queries
+    total_earnings = (annual_queries / 100000) * 4
+
+    # Calculate the curator's share (10% of total earnings)
+    curator_share = total_earnings * 0.1
+
+    table = OpportunityTable(
+        ipfs_hash=ipfs_hash,
+        signal_amount=signal_amount,
+        signalled_tokens=signalled_tokens,
+        annual_queries=annual_queries,
+        total_earnings=total_earnings,
+        curator_share=curator_share,
+        estimated_earnings=np.zeros(len(ipfs_hash)),
+        apr=np.zeros(len(ipfs_hash)),
+        weekly_queries=weekly_queries
+    )
+    table.estimated_earnings = table.earnings()
+    table.apr = table.apr_with(grt_price)
+
+    # Filter out subgraphs with zero signal amounts
+    return table.take(table.signal_amount > 0)
+
+@timed('opportunities.calculate_opportunities')
 def calculate_opportunities(
     deployments: List[Dict],
     query_fees: Dict[str, float],
     query_counts: Dict[str, int],
     grt_price: float
-) -> List[Opportunity]:
+) -> OpportunityTable:
     """Calculate investment opportunities from deployment and query data."""
-    opportunities = []
-
-    for deployment in deployments:
-        ipfs_hash = deployment['ipfsHash']
-        signal_amount = float(deployment['signalAmount']) / 1e18  # Convert wei to GRT
-        signalled_tokens = float(deployment['signalledTokens']) / 1e18  # Convert wei to GRT
-
-        if ipfs_hash in query_counts:
-            weekly_queries = query_counts[ipfs_hash]
-            annual_queries = weekly_queries * 52  # Annualize the queries
-
-            # Calculate total earnings based on $4 per 100,000 queries
-            total_earnings = (annual_queries / 100000) * 4
-
-            # Calculate the curator's share (10% of total earnings)
-            curator_share = total_earnings * 0.1
-
-            # Calculate the portion owned by the curator
-            if signalled_tokens > 0:
-                portion_owned = signal_amount / signalled_tokens
-            else:
-                portion_owned = 0
-
-            # Calculate estimated annual earnings for this curator
-            estimated_earnings = curator_share * portion_owned
-
-            # Calculate APR using GRT price
-            if signal_amount > 0:
-                apr = (estimated_earnings / (signal_amount * grt_price)) * 100
-            else:
-                apr = 0
-
-            opportunities.append(Opportunity(
-                ipfs_hash=ipfs_hash,
-                signal_amount=signal_amount,
-                signalled_tokens=signalled_tokens,
-                annual_queries=annual_queries,
-                total_earnings=total_earnings,
-                curator_share=curator_share,
-                estimated_earnings=estimated_earnings,
-                apr=apr,
-                weekly_queries=weekly_queries
-            ))
-
-    # Filter out subgraphs with zero signal amounts
-    opportunities = [opp for opp in opportunities if opp.signal_amount > 0]
+    table = opportunity_rows(deployments, query_counts, grt_price)
 
     # Sort opportunities by APR in descending order
-    return sorted(opportunities, key=lambda x: x.apr, reverse=True)
+    return table.take(np.argsort(-table.apr, kind='stable'))
 
-def calculate_signal_distribution(
-    opportunities: List[Opportunity],
+def _best_rows(table: OpportunityTable, arrival: np.ndarray, limit: Optional[int]) -> Tuple[OpportunityTable, np.ndarray]:
+    """Rows sorted by APR descending, ties in arrival order, cut to `limit`."""
+    order = np.lexsort((arrival, -table.apr))[:limit]
+    return table.take(order), arrival[order]
+
+@timed('opportunities.calculate_opportunities_streaming')
+def calculate_opportunities_streaming(
+    pages: Iterable[List[Dict]],
+    query_counts: Dict[str, int],
+    grt_price: float,
+    top_n: Optional[int] = None
+) -> OpportunityTable:
+    """Calculate opportunities from deployments delivered one page at a time.
+
+    Each page is parsed and joined against `query_counts` as it arrives and
+    then dropped, so raw deployments never accumulate. With `top_n` only the
+    best rows so far are kept, compacted once another `top_n` rows have
+    been buffered. The result matches calculate_opportunities over the
+    concatenated pages, cut to `top_n` rows.
+    """
+    kept = OpportunityTable.concat([])
+    kept_arrival = np.zeros(0, dtype=np.int64)
+    batches, arrivals = [], []
+    buffered = arrived = 0
+
+    for page in pages:
+        batch = opportunity_rows(page, query_counts, grt_price)
+        batches.append(batch)
+        arrivals.append(np.arange(arrived, arrived + len(batch), dtype=np.int64))
+        arrived += len(batch)
+        buffered += len(batch)
+        if top_n is not None and buffered > top_n:
+            kept, kept_arrival = _best_rows(
+                OpportunityTable.concat([kept] + batches), np.concatenate([kept_arrival] + arrivals), top_n
+            )
+            batches, arrivals = [], []
+            buffered = 0
+
+    return _best_rows(OpportunityTable.concat([kept] + batches), np.concatenate([kept_arrival] + arrivals), top_n)[0]
+
+def allocate_signal_greedily(
+    opportunities: Sequence[Opportunity],
+    allocations: Dict[str, float],
     total_signal: float,
-    grt_price: float
+    grt_price: float,
+    step: float = 100
 ) -> Dict[str, float]:
-    """Calculate optimal signal distribution across opportunities."""
-    # Initialize allocation dictionary
-    allocations = {opp.ipfs_hash: 0 for opp in opportunities}
+    """Hand out signal in fixed steps, each to the opportunity with the best next-step APR.
+
+    Candidates sit in a max-heap keyed on the APR they would have after one
+    more step. Only the chosen opportunity's APR changes, so each step is a
+    single heap replace instead of a rescan of every opportunity. Ties go to
+    the earliest opportunity in the input order.
+    """
+    def next_step_apr(index: int) -> float:
+        opp = opportunities[index]
+        new_signal_amount = opp.signal_amount + allocations[opp.ipfs_hash] + step
+        new_signalled_tokens = opp.signalled_tokens + allocations[opp.ipfs_hash] + step
+        portion_owned = new_signal_amount / new_signalled_tokens
+        estimated_earnings = opp.curator_share * portion_owned
+        return (estimated_earnings / (new_signal_amount * grt_price)) * 100
+
+    heap = [(-next_step_apr(i), i) for i in range(len(opportunities))]
+    heapq.heapify(heap)
     remaining_signal = total_signal
 
-    # Iterative allocation process
-    while remaining_signal > 0:
-        best_apr = -1
-        best_opp = None
-
-        for opp in opportunities:
-            ipfs_hash = opp.ipfs_hash
-            signal_amount = opp.signal_amount + allocations[ipfs_hash]
-            signalled_tokens = opp.signalled_tokens + allocations[ipfs_hash]
-            
-            # Calculate APR if we add 100 more tokens
-            new_signal_amount = signal_amount + 100
-            new_signalled_tokens = signalled_tokens + 100
-            portion_owned = new_signal_amount / new_signalled_tokens
-            estimated_earnings = opp.curator_share * portion_owned
-            apr = (estimated_earnings / (new_signal_amount * grt_price)) * 100
-
-            if apr > best_apr:
-                best_apr = apr
-                best_opp = opp
-
-        # Allocate 100 tokens to the best opportunity
-        if best_opp:
-            allocations[best_opp.ipfs_hash] += min(100, remaining_signal)
-            remaining_signal -= 100
-        else:
+    while remaining_signal > 0 and heap:
+        negative_apr, index = heap[0]
+        if -negative_apr <= -1:
             break
+        allocations[opportunities[index].ipfs_hash] += min(step, remaining_signal)
+        remaining_signal -= step
+        heapq.heapreplace(heap, (-next_step_apr(index), index))
 
     return allocations
+
+@timed('opportunities.calculate_signal_distribution')
+def calculate_signal_distribution(
+    opportunities: Sequence[Opportunity],
+    total_signal: float,
+    grt_price: float
+) -> Dict[str, float]:
+    """Calculate optimal signal distribution across opportunities."""
+    opportunities = list(opportunities)
+    allocations = {opp.ipfs_hash: 0 for opp in opportunities}
+    return allocate_signal_greedily(opportunities, allocations, total_signal, grt_price)
@@ -1,6 +1,8 @@
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence
 from dataclasses import dataclass
-from models.opportunities import Opportunity
+import numpy as np
+from models.opportunities import Opportunity, OpportunityTable, allocate_signal_greedily
+from utils.metrics import timed
 
 @dataclass
 class UserOpportunity:
@@ -13,38 +15,41 @@ class UserOpportunity:
     apr: float
     weekly_queries: int
 
+@timed('signals.calculate_user_opportunities')
 def calculate_user_opportunities(
     user_signals: Dict[str, float],
-    opportunities: List[Opportunity],
+    opportunities: Sequence[Opportunity],
     grt_price: float
 ) -> List[UserOpportunity]:
     """Calculate user-specific opportunities from their current signals."""
-    user_opportunities = []
+    table = OpportunityTable.from_opportunities(opportunities)
+    held = table.take(np.array([ipfs_hash in user_signals for ipfs_hash in table.ipfs_hash], dtype=bool))
     
-    for opp in opportunities:
-        ipfs_hash = opp.ipfs_hash
-        
-        if ipfs_hash in user_signals:
-            user_signal = user_signals[ipfs_hash]
-            total_signal = opp.signalled_tokens
-            portion_owned = user_signal / total_signal if total_signal > 0 else 0
-            estimated_earnings = opp.curator_share * portion_owned
-            apr = (estimated_earnings / (user_signal * grt_price)) * 100 if user_signal > 0 else 0
-            
-            user_opportunities.append(UserOpportunity(
-                ipfs_hash=ipfs_hash,
-                user_signal=user_signal,
-                total_signal=total_signal,
-                portion_owned=portion_owned,
-                estimated_earnings=estimated_earnings,
-                apr=apr,
-                weekly_queries=opp.weekly_queries
-            ))
+    user_signal = np.array([user_signals[ipfs_hash] for ipfs_hash in held.ipfs_hash], dtype=float)
+    total_signal = held.signalled_tokens
+    with np.errstate(divide='ignore', invalid='ignore'):
+        portion_owned = np.where(total_signal > 0, user_signal / total_signal, 0.0)
+        estimated_earnings = held.curator_share * portion_owned
+        apr = np.where(user_signal > 0, (estimated_earnings / (user_signal * grt_price)) * 100, 0.0)
+    
+    user_opportunities = [
+        UserOpportunity(
+            ipfs_hash=held.ipfs_hash[i],
+            user_signal=float(user_signal[i]),
+            total_signal=float(total_signal[i]),
+            portion_owned=float(portion_owned[i]),
+            estimated_earnings=float(estimated_earnings[i]),
+            apr=float(apr[i]),
+            weekly_queries=int(held.weekly_queries[i])
+        )
+        for i in range(len(held))
+    ]
     
     return sorted(user_opportunities, key=lambda x: x.apr, reverse=True)
 
+@timed('signals.calculate_optimal_allocations')
 def calculate_optimal_allocations(
-    opportunities: List[Opportunity],
+    opportunities: Sequence[Opportunity],
     user_signals: Dict[str, float],
     total_signal: float,
     grt_price: float,
@@ -80,36 +85,6 @@ def calculate_optimal_allocations(
     # Select top opportunities
     top_opportunities = adjusted_opportunities[:num_subgraphs]
 
-    # Initialize allocation dictionary
+    # Allocate in 100 GRT steps to the best next-step APR
     allocations = {opp.ipfs_hash: 0 for opp in top_opportunities}
-    remaining_signal = total_signal
-
-    # Iterative allocation process
-    while remaining_signal > 0:
-        best_apr = -1
-        best_opp = None
-
-        for opp in top_opportunities:
-            ipfs_hash = opp.ipfs_hash
-            signal_amount = opp.signal_amount + allocations[ipfs_hash]
-            signalled_tokens = opp.signalled_tokens + allocations[ipfs_hash]
-            
-            # Calculate APR if we add 100 more tokens
-            new_signal_amount = signal_amount + 100
-            new_signalled_tokens = signalled_tokens + 100
-            portion_owned = new_signal_amount / new_signalled_tokens
-            estimated_earnings = opp.curator_share * portion_owned
-            apr = (estimated_earnings / (new_signal_amount * grt_price)) * 100
-
-            if apr > best_apr:
-                best_apr = apr
-                best_opp = opp
-
-        # Allocate 100 tokens to the best opportunity
-        if best_opp:
-            allocations[best_opp.ipfs_hash] += min(100, remaining_signal)
-            remaining_signal -= 100
-        else:
-            break
-
-    return allocations
+    return allocate_signal_greedily(top_opportunities, allocations, total_signal, grt_price)
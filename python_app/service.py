@@ -0,0 +1,290 @@
+"""Allocation service: a JSON HTTP API over one shared, background-refreshed network snapshot.
+
+Usage:
+    python service.py --port 8080
+    curl 'localhost:8080/wallets/0xabc.../allocation?balance=10000&method=water_fill'
+
+Endpoints:
+    GET /health
+    GET /opportunities?limit=100
+    GET /wallets/<wallet>/opportunities
+    GET /wallets/<wallet>/allocation?balance=<grt>&method=<method>&max_positions=<n>
+    GET /metrics?format=prometheus
+"""
+import argparse
+import json
+import logging
+import math
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+from api.graph_api import get_user_curation_signal, get_account_balance
+from api.refresher import NetworkRefresher, NetworkSnapshot
+from models.signals import calculate_user_opportunities
+from models.allocation.optimizer import AllocationOptimizer, optimize_cached
+from utils.cache import SharedLRUCache
+from utils.config import OPPORTUNITY_SNAPSHOT_DIR, RESULT_CACHE_SIZE
+from utils.metrics import REGISTRY, counter, profiled
+
+logger = logging.getLogger(__name__)
+
+ROUTES = ('health', 'metrics', 'opportunities', 'user_opportunities', 'allocation', 'not_found')
+
+def non_negative_int(value: str) -> int:
+    """Parse a count such as a row limit, rejecting negative values with ValueError."""
+    number = int(value)
+    if number < 0:
+        raise ValueError(value)
+    return number
+
+class RequestError(Exception):
+    """A client error, answered with `status` instead of 500."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+class RequestCoalescer:
+    """Runs identical concurrent requests once and hands every caller the same result."""
+
+    def __init__(self):
+        self.coalesced = 0  # Callers served by another caller's work
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: Hashable, func: Callable):
+        """Return func(), or wait for the call already in flight under `key`."""
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+                counter('coalesced_requests_total')
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return future.result()
+
+class AllocationService:
+    """Endpoint logic, independent of the HTTP layer."""
+
+    def __init__(
+        self,
+        refresher: NetworkRefresher,
+        fetch_user_signals: Callable[[str, Optional[int]], Dict[str, float]] = get_user_curation_signal,
+        fetch_balance: Callable[[str, Optional[int]], float] = get_account_balance,
+        result_cache_size: int = RESULT_CACHE_SIZE
+    ):
+        self.refresher = refresher
+        self.fetch_user_signals = fetch_user_signals
+        self.fetch_balance = fetch_balance
+        self.results = SharedLRUCache(result_cache_size, name='allocation_results')
+        self.coalescer = RequestCoalescer()
+        self.latency = {route: REGISTRY.histogram('service_request_seconds', route=route) for route in ROUTES}
+
+    def snapshot(self) -> NetworkSnapshot:
+        """The current network snapshot, or a 503 while there is none."""
+        snapshot = self.refresher.snapshot(timeout=0)
+        if snapshot is None:
+            raise RequestError("Network data is not available yet", status=503)
+        return snapshot
+
+    def health(self) -> Dict:
+        snapshot = self.refresher.snapshot(timeout=0)
+        return {
+            'status': 'ok' if snapshot else 'starting',
+            'snapshot_version': snapshot.version if snapshot else None,
+            'snapshot_id': snapshot.snapshot_id if snapshot else None,
+            'block_number': snapshot.block_number if snapshot else None,
+            'refreshed_at': snapshot.refreshed_at if snapshot else None
+        }
+
+    def opportunities(self, limit: int = 100) -> Dict:
+        """The best `limit` opportunities by APR."""
+        snapshot = self.snapshot()
+        return {
+            'snapshot_version': snapshot.version,
+            'snapshot_id': snapshot.snapshot_id,
+            'grt_price': snapshot.grt_price,
+            'opportunities': [asdict(opp) for opp in snapshot.opportunities[:limit]]
+        }
+
+    def user_opportunities(self, wallet: str) -> Dict:
+        """Earnings and APR of a wallet's signals as of the snapshot's block."""
+        snapshot = self.snapshot()
+
+        def compute() -> Dict:
+            user_signals = self.fetch_user_signals(wallet, snapshot.block_number)
+            user_opportunities = calculate_user_opportunities(user_signals, snapshot.opportunities, snapshot.grt_price)
+            return {
+                'wallet': wallet,
+                'snapshot_version': snapshot.version,
+                'snapshot_id': snapshot.snapshot_id,
+                'grt_price': snapshot.grt_price,
+                'opportunities': [asdict(opp) for opp in user_opportunities]
+            }
+
+        return self.coalescer.run(('user_opportunities', wallet, snapshot.snapshot_id), compute)
+
+    def allocation(self, wallet: str, balance: Optional[float], method: str, max_positions: Optional[int]) -> Dict:
+        """Optimal allocation of `balance` GRT, or the wallet's balance as of the snapshot's block."""
+        if method not in AllocationOptimizer.METHODS:
+            raise RequestError(f"Unknown allocation method: {method}")
+        if max_positions is not None and method != "exact":
+            raise RequestError("max_positions is only supported by the exact method")
+        if max_positions is not None and max_positions < 1:
+            raise RequestError("max_positions must be at least 1")
+        snapshot = self.snapshot()
+        available_grt = self.fetch_balance(wallet, snapshot.block_number) if balance is None else balance
+        if not math.isfinite(available_grt) or available_grt <= 0:
+            raise RequestError("Available GRT must be a finite number greater than 0")
+
+        def compute() -> Dict:
+            # Repeat requests on the same snapshot are answered from the result cache
+            result = optimize_cached(
+                self.results,
+                snapshot.snapshot_id,
+                wallet,
+                snapshot.opportunities,
+                snapshot.grt_price,
+                available_grt,
+                method=method,
+                max_positions=max_positions
+            )
+            return dict(
+                asdict(result),
+                wallet=wallet,
+                method=method,
+                available_grt=available_grt,
+                snapshot_version=snapshot.version,
+                snapshot_id=snapshot.snapshot_id,
+                grt_price=snapshot.grt_price
+            )
+
+        key = ('allocation', wallet, available_grt, method, max_positions, snapshot.snapshot_id)
+        return self.coalescer.run(key, compute)
+
+    def metrics(self, output_format: str = 'json'):
+        """Service latency, coalescing and result cache use, plus every process-wide metric."""
+        if output_format == 'prometheus':
+            return REGISTRY.to_prometheus()
+        return {
+            'coalesced_requests': self.coalescer.coalesced,
+            'result_cache': self.results.stats(),
+            'latency_seconds': {route: histogram.summary() for route, histogram in self.latency.items()},
+            'process': REGISTRY.to_json()
+        }
+
+    def handle(self, path: str, params: Dict[str, List[str]]) -> Tuple[int, object]:
+        """Route one GET request, timing it under its route name.
+
+        Returns (status, body); the body is a dict for JSON or a string for plain text.
+        """
+        route, call = self._route(path, params)
+        start = time.perf_counter()
+        try:
+            with profiled(f'service.{route}'):
+                return 200, call()
+        except RequestError as e:
+            return e.status, {'error': str(e)}
+        except Exception as e:
+            logger.exception(f"{route} failed")
+            return 500, {'error': str(e)}
+        finally:
+            self.latency[route].observe(time.perf_counter() - start)
+
+    def _route(self, path: str, params: Dict[str, List[str]]) -> Tuple[str, Callable[[], Dict]]:
+        """Map a path to a route name and a call that produces the response body."""
+        def param(name: str, convert: Callable, default=None):
+            if name not in params:
+                return default
+            try:
+                return convert(params[name][0])
+            except ValueError:
+                raise RequestError(f"Invalid {name}: {params[name][0]}")
+
+        parts = [part for part in path.split('/') if part]
+        if parts == ['health']:
+            return 'health', self.health
+        if parts == ['metrics']:
+            return 'metrics', lambda: self.metrics(param('format', str, 'json'))
+        if parts == ['opportunities']:
+            return 'opportunities', lambda: self.opportunities(param('limit', non_negative_int, 100))
+        if len(parts) == 3 and parts[0] == 'wallets' and parts[2] == 'opportunities':
+            return 'user_opportunities', lambda: self.user_opportunities(parts[1].lower())
+        if len(parts) == 3 and parts[0] == 'wallets' and parts[2] == 'allocation':
+            return 'allocation', lambda: self.allocation(
+                parts[1].lower(),
+                param('balance', float),
+                param('method', str, 'water_fill'),
+                param('max_positions', int)
+            )
+
+        def not_found() -> Dict:
+            raise RequestError(f"Not found: {path}", status=404)
+        return 'not_found', not_found
+
+def make_handler(service: AllocationService) -> type:
+    """Build a request handler class bound to `service`."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, body = service.handle(url.path, parse_qs(url.query))
+            if isinstance(body, str):
+                payload, content_type = body.encode(), 'text/plain; version=0.0.4'
+            else:
+                payload, content_type = json.dumps(body).encode(), 'application/json'
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+def serve(service: AllocationService, host: str, port: int) -> ThreadingHTTPServer:
+    """Create a threaded HTTP server for `service`; call serve_forever() to run it."""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Serve allocations over a JSON HTTP API.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    service = AllocationService(NetworkRefresher(snapshot_dir=OPPORTUNITY_SNAPSHOT_DIR).start())
+    server = serve(service, args.host, args.port)
+    logger.info(f"Serving on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.refresher.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
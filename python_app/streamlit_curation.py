@@ -1,16 +1,26 @@
 import streamlit as st
-from utils.config import DEFAULT_WALLET
-from api.graph_api import get_subgraph_deployments, get_grt_price, get_user_curation_signal
-from api.supabase_api import process_query_data
-from models.opportunities import calculate_opportunities
+from utils.config import DEFAULT_WALLET, OPPORTUNITY_SNAPSHOT_DIR
+from api.graph_api import get_wallet_data
+from api.refresher import NetworkRefresher
+from utils.metrics import profiled, span
 from models.signals import calculate_user_opportunities
 from ui.tabs.summary_tab import render_summary_tab
 from ui.tabs.curation_signal_tab import render_curation_signal_tab
 from ui.tabs.opportunities_tab import render_opportunities_tab
 from ui.tabs.subgraph_list_tab import render_subgraph_list_tab
 
+@st.cache_resource
+def get_network_refresher() -> NetworkRefresher:
+    """One background refresher per server process, shared by every session."""
+    return NetworkRefresher(snapshot_dir=OPPORTUNITY_SNAPSHOT_DIR).start()
+
 def main():
     """Main application entry point."""
+    with profiled('streamlit_run'):
+        render_page()
+
+def render_page():
+    """Fetch the wallet's data and render every tab."""
     st.title("Curation Signal Allocation Optimizer")
     st.write("This app helps you allocate your curation signal across subgraphs to maximize your APR.")
 
@@ -21,13 +31,22 @@ def main():
     tab_labels = ["Summary", "Your Current Curation Signal", "Find Opportunities", "Full Subgraph List"]
     tabs = st.tabs(tab_labels)
 
-    # Data Retrieval and Processing
-    deployments = get_subgraph_deployments()
-    query_fees, query_counts = process_query_data()
-    grt_price = get_grt_price()
-    opportunities = calculate_opportunities(deployments, query_fees, query_counts, grt_price)
+    # Network data comes from the last published snapshot; only the first run waits for it
+    snapshot = get_network_refresher().snapshot()
+    if snapshot is None:
+        st.error("Network data is not available yet; check the logs and reload.")
+        return
+    grt_price = snapshot.grt_price
+    opportunities = snapshot.opportunities
 
-    user_signals = get_user_curation_signal(wallet_address)
+    # Signals and balance come back from one request, read at the snapshot's block so
+    # they describe the same network state as the opportunities
+    try:
+        signals_by_wallet, balances = get_wallet_data([wallet_address], snapshot.block_number)
+    except Exception as e:
+        st.error(f"Error fetching wallet data: {str(e)}")
+        return
+    user_signals = signals_by_wallet[wallet_address]
     if not user_signals:
         st.warning("No curation signals found for this wallet address.")
         return
@@ -38,17 +57,23 @@ def main():
         return
 
     # Render each tab
-    with tabs[0]:  # Summary tab
+    with tabs[0], span('ui.summary_tab'):  # Summary tab
         render_summary_tab(wallet_address, grt_price, user_signals, user_opportunities)
 
     if wallet_address:
-        with tabs[1]:  # Your Current Curation Signal tab
+        with tabs[1], span('ui.curation_signal_tab'):  # Your Current Curation Signal tab
             render_curation_signal_tab(user_opportunities, grt_price)
         
-        with tabs[2]:  # Find Opportunities tab
-            render_opportunities_tab(opportunities, grt_price, wallet_address)
+        with tabs[2], span('ui.opportunities_tab'):  # Find Opportunities tab
+            render_opportunities_tab(
+                opportunities,
+                grt_price,
+                wallet_address,
+                fetch_balance=lambda: balances[wallet_address],
+                snapshot_id=snapshot.snapshot_id
+            )
 
-        with tabs[3]:  # Full Subgraph List tab
+        with tabs[3], span('ui.subgraph_list_tab'):  # Full Subgraph List tab
             render_subgraph_list_tab(opportunities)
 
 if __name__ == "__main__":
@@ -1,7 +1,15 @@
+import itertools
+import math
 import pytest
 import numpy as np
-from models.opportunities import Opportunity
-from models.allocation.optimizer import AllocationOptimizer, AllocationResult
+import models.allocation.optimizer as optimizer_module
+from models.opportunities import Opportunity, OpportunityTable
+from models.allocation.optimizer import AllocationOptimizer, AllocationResult, optimize_cached
+from models.allocation.exact import net_returns, solve_exact
+from models.allocation.pruning import dominance_threshold, water_fill_candidates
+from models.allocation.water_fill import repair_water_level, solve_water_level
+from models.allocation.sweep import sweep_scenarios
+from utils.cache import SharedLRUCache
 
 @pytest.fixture
 def sample_opportunities():
@@ -196,3 +204,278 @@ def test_diverse_scenario_optimization(diverse_opportunities):
     
     # But not all funds (due to risk management)
     assert allocations[0][1] < available_grt * 0.5
+
+def test_water_fill_respects_budget_and_cap(diverse_opportunities):
+    """Test that the water-fill solver stays within budget and the 10% cap."""
+    grt_price = 0.001
+    optimizer = AllocationOptimizer(diverse_opportunities, grt_price)
+    
+    available_grt = 100000
+    result = optimizer.optimize_allocation(available_grt, method="water_fill")
+    
+    assert isinstance(result, AllocationResult)
+    assert result.total_allocated <= available_grt + 1e-6
+    for allocation in result.allocations.values():
+        assert 0 < allocation <= available_grt * 0.10 + 1e-6
+
+def test_water_fill_equalizes_marginal_returns():
+    """Test that uncapped positions end up with equal marginal returns."""
+    opportunities = [
+        Opportunity(
+            ipfs_hash=f"hash{i}",
+            signal_amount=1000 * (i + 1),
+            signalled_tokens=10000 * (i + 1),
+            annual_queries=1000000 * (20 - i),
+            total_earnings=40 * (20 - i),
+            curator_share=4 * (20 - i),
+            estimated_earnings=0.4 * (20 - i) / (i + 1),
+            apr=0.0,
+            weekly_queries=19230 * (20 - i)
+        )
+        for i in range(20)
+    ]
+    grt_price = 0.01
+    optimizer = AllocationOptimizer(opportunities, grt_price)
+    
+    available_grt = 200000
+    result = optimizer.optimize_allocation(available_grt, method="water_fill")
+    cap = available_grt * 0.10
+    
+    assert abs(result.total_allocated - available_grt) < 0.01
+    marginals = [
+        opp.curator_share * opp.signalled_tokens / (opp.signalled_tokens + result.allocations[opp.ipfs_hash]) ** 2
+        for opp in opportunities
+        if 0 < result.allocations.get(opp.ipfs_hash, 0) < cap - 1e-6
+    ]
+    assert len(marginals) >= 2
+    assert max(marginals) - min(marginals) < 1e-9
+
+def test_water_fill_skips_unprofitable_positions(sample_opportunities):
+    """Test that positions whose return cannot cover the entry cost get nothing."""
+    grt_price = 10.0
+    optimizer = AllocationOptimizer(sample_opportunities, grt_price)
+    
+    result = optimizer.optimize_allocation(5000, method="water_fill")
+    
+    assert result.allocations == {}
+    assert result.total_allocated == 0
+
+def test_unknown_allocation_method(sample_opportunities):
+    """Test that an unknown solver name is rejected."""
+    optimizer = AllocationOptimizer(sample_opportunities, 0.1)
+    
+    with pytest.raises(Exception):
+        optimizer.optimize_allocation(5000, method="simplex")
+
+@pytest.mark.parametrize("available_grt, budget_binds", [(500000, False), (50000, True)])
+def test_reoptimize_matches_full_solve(monkeypatch, available_grt, budget_binds):
+    """Test that repairing a result after a few changes matches solving from scratch, with and without a binding budget."""
+    rng = np.random.default_rng(5)
+    opportunities = [
+        Opportunity(
+            ipfs_hash=f"hash{i}",
+            signal_amount=1000,
+            signalled_tokens=float(rng.uniform(1e3, 1e6)),
+            annual_queries=0,
+            total_earnings=0,
+            curator_share=float(rng.pareto(1.2) * 10),
+            estimated_earnings=0,
+            apr=0,
+            weekly_queries=0
+        )
+        for i in range(300)
+    ]
+    grt_price = 0.1
+    optimizer = AllocationOptimizer(opportunities, grt_price)
+    previous = optimizer.optimize_allocation(available_grt, method="water_fill")
+    assert previous.water_level is not None
+    assert (previous.water_level > 0) == budget_binds
+    
+    # The result must come from the incremental repair, not the full-solve fallback
+    repairs = []
+    def spy_repair(*args):
+        repairs.append(repair_water_level(*args))
+        return repairs[-1]
+    monkeypatch.setattr(optimizer_module, 'repair_water_level', spy_repair)
+    monkeypatch.setattr(optimizer, 'optimize_allocation', lambda *args, **kwargs: pytest.fail("fell back to a full solve"))
+    
+    changed = [
+        Opportunity(opportunities[i].ipfs_hash, 1000, opportunities[i].signalled_tokens * 0.9, 0, 0,
+                    opportunities[i].curator_share * 1.1, 0, 0, 0)
+        for i in (3, 50, 120)
+    ]
+    changed.append(Opportunity("new_hash", 1000, 50000, 0, 0, 25, 0, 0, 0))
+    result = optimizer.reoptimize_allocation(previous, changed, available_grt)
+    
+    updated = opportunities + [changed[-1]]
+    for opp in changed[:-1]:
+        updated[int(opp.ipfs_hash[4:])] = opp
+    expected = AllocationOptimizer(updated, grt_price).optimize_allocation(available_grt, method="water_fill")
+    
+    assert len(repairs) == 1 and repairs[0] is not None
+    assert (result.water_level > 0) == budget_binds
+    assert len(optimizer.opportunities) == 301
+    assert result.total_allocated == pytest.approx(expected.total_allocated)
+    for ipfs_hash in set(result.allocations) | set(expected.allocations):
+        assert result.allocations.get(ipfs_hash, 0) == pytest.approx(expected.allocations.get(ipfs_hash, 0), abs=1e-3)
+
+def test_scenario_sweep_matches_serial(diverse_opportunities):
+    """Test that the process pool sweep matches running every scenario directly."""
+    grt_prices = [0.001, 0.01, 0.1]
+    budgets = [1000, 10000]
+    
+    frame = sweep_scenarios(diverse_opportunities, grt_prices, budgets, max_workers=2, include_allocations=True)
+    
+    assert list(zip(frame.grt_price, frame.available_grt)) == [(p, b) for p in grt_prices for b in budgets]
+    for row in frame.itertuples():
+        expected = AllocationOptimizer(diverse_opportunities, row.grt_price).optimize_allocation(
+            row.available_grt, method="water_fill")
+        assert row.allocations == expected.allocations
+        assert row.expected_earnings == pytest.approx(expected.expected_earnings)
+        assert row.positions == len(expected.allocations)
+
+def test_pruned_greedy_matches_full_scan(monkeypatch):
+    """Test that greedy allocation over the pruned frontier matches scanning every opportunity."""
+    rng = np.random.default_rng(13)
+    opportunities = [
+        Opportunity(
+            ipfs_hash=f"hash{i}",
+            signal_amount=float(rng.uniform(0, 1000)),
+            signalled_tokens=float(rng.uniform(1e3, 1e6)),
+            annual_queries=int(rng.pareto(1.0) * 1e6),
+            total_earnings=0,
+            curator_share=float(rng.uniform(0, 100)),  # Greedy scores use annual_queries instead
+            estimated_earnings=0,
+            apr=0,
+            weekly_queries=0
+        )
+        for i in range(400)
+    ]
+    
+    for available_grt in (500, 5000, 100000):
+        optimizer = AllocationOptimizer(opportunities, 0.1)
+        frontier = optimizer._greedy_frontier(available_grt)
+        assert len(frontier.order) < len(opportunities)
+        pruned = optimizer.optimize_allocation(available_grt)
+        
+        monkeypatch.setattr(optimizer, '_greedy_frontier', lambda available_grt: None)
+        full = optimizer.optimize_allocation(available_grt)
+        assert pruned.allocations == full.allocations
+
+@pytest.mark.parametrize("method", ["greedy", "water_fill"])
+def test_pruning_keeps_every_candidate_for_unbounded_budget(diverse_opportunities, method):
+    """Test that an infinite budget disables pruning instead of failing in the bound."""
+    assert dominance_threshold(np.array([1.0, 2.0]), math.inf, math.inf) == -math.inf
+
+    result = AllocationOptimizer(diverse_opportunities, 0.1).optimize_allocation(math.inf, method=method)
+    assert result.allocations
+
+def test_pruned_water_fill_matches_full_solve():
+    """Test that dropping provably empty positions doesn't change the water-fill solution."""
+    rng = np.random.default_rng(14)
+    n = 2000
+    curator_shares = rng.pareto(1.2, n) * 10
+    signalled_tokens = rng.uniform(1e3, 1e6, n)
+    opportunities = OpportunityTable(
+        ipfs_hash=np.array([f"hash{i}" for i in range(n)], dtype=object),
+        signal_amount=np.zeros(n),
+        signalled_tokens=signalled_tokens,
+        annual_queries=np.zeros(n, dtype=np.int64),
+        total_earnings=np.zeros(n),
+        curator_share=curator_shares,
+        estimated_earnings=np.zeros(n),
+        apr=np.zeros(n),
+        weekly_queries=np.zeros(n, dtype=np.int64)
+    )
+    
+    for available_grt in (1000, 200000, 1e9):
+        optimizer = AllocationOptimizer(opportunities, 0.1)
+        cap = available_grt * optimizer.MAX_POSITION_PERCENTAGE
+        candidates = water_fill_candidates(curator_shares, signalled_tokens, available_grt, optimizer._unit_cost(), cap)
+        result = optimizer.optimize_allocation(available_grt, method="water_fill")
+        amounts, level = solve_water_level(curator_shares, signalled_tokens, available_grt, optimizer._unit_cost(), cap)
+        
+        assert len(candidates) < n
+        assert set(result.allocations) == {f"hash{i}" for i in np.flatnonzero(amounts > 0)}
+        assert result.water_level == pytest.approx(level)
+        for ipfs_hash, amount in result.allocations.items():
+            assert amount == pytest.approx(amounts[int(ipfs_hash[4:])])
+
+def test_exact_matches_enumeration():
+    """Test the exact solver against trying every set of open positions."""
+    rng = np.random.default_rng(15)
+    n = 8
+    curator_shares = rng.pareto(1.2, n) * 20
+    signalled_tokens = rng.uniform(1e3, 1e5, n)
+    budget, unit_cost, cap, position_cost, max_positions = 20000, 0.0005, 6000, 2.0, 3
+    
+    amounts, value, gap = solve_exact(
+        curator_shares, signalled_tokens, budget, unit_cost, cap, position_cost, max_positions, time_budget=10
+    )
+    
+    best = 0.0
+    for size in range(1, max_positions + 1):
+        for members in itertools.combinations(range(n), size):
+            subset = list(members)
+            fill, _ = solve_water_level(curator_shares[subset], signalled_tokens[subset], budget, unit_cost, cap)
+            net = net_returns(curator_shares[subset], signalled_tokens[subset], fill, unit_cost)
+            best = max(best, net[fill > 0].sum() - position_cost * (fill > 0).sum())
+    
+    assert gap == 0.0
+    assert value == pytest.approx(best)
+    assert (amounts > 0).sum() <= max_positions
+    assert amounts.sum() <= budget + 1e-6
+
+def test_exact_method_limits_positions(diverse_opportunities):
+    """Test the exact method through the optimizer with a position limit and cost."""
+    optimizer = AllocationOptimizer(diverse_opportunities, 0.01, position_cost=0.5)
+    result = optimizer.optimize_allocation(10000, method="exact", max_positions=2)
+    
+    assert 0 < len(result.allocations) <= 2
+    assert result.total_allocated <= 10000 + 1e-6
+    assert result.optimality_gap == 0.0
+    assert result.water_level is None
+    
+    with pytest.raises(Exception):
+        optimizer.optimize_allocation(10000, method="water_fill", max_positions=2)
+
+def test_apr_cache_matches_direct_evaluation(diverse_opportunities):
+    """Test that memoized marginal APRs match calculate_opportunity_apr and that the cache is hit."""
+    optimizer = AllocationOptimizer(diverse_opportunities, 0.01)
+    result = optimizer.optimize_allocation(5000)
+    
+    assert optimizer.apr_cache.hits > 0
+    assert 0 < optimizer.apr_cache.hit_rate < 1
+    assert len(optimizer.apr_cache) <= optimizer.APR_CACHE_SIZE
+    for index, opp in enumerate(optimizer.opportunities):
+        assert optimizer._marginal_apr(index, 1234.0) == optimizer.calculate_opportunity_apr(opp, 1234.0)
+    
+    # A new price must not reuse APRs computed at the old one
+    optimizer.grt_price = 0.02
+    best_opp, (apr, _) = optimizer.find_best_opportunity({}, 10)
+    expected = max(optimizer.calculate_opportunity_apr(opp, 10)[0] for opp in optimizer.opportunities)
+    assert apr == pytest.approx(expected - optimizer.ENTRY_COST_PERCENTAGE * 100)
+
+def test_portfolio_metrics_follow_price_change(diverse_opportunities):
+    """Test that portfolio metrics computed after a price change match a fresh optimizer."""
+    optimizer = AllocationOptimizer(diverse_opportunities, 1.0)
+    allocations = {opp.ipfs_hash: 1000.0 for opp in diverse_opportunities[:3]}
+    optimizer.calculate_portfolio_metrics(allocations)
+
+    optimizer.grt_price = 0.1
+    fresh = AllocationOptimizer(diverse_opportunities, 0.1)
+    assert optimizer.calculate_portfolio_metrics(allocations) == fresh.calculate_portfolio_metrics(allocations)
+
+def test_optimize_cached_reuses_results(diverse_opportunities):
+    """Test that results are reused for identical inputs and recomputed when any input changes."""
+    cache = SharedLRUCache(maxsize=4, name='allocation_results')
+    table = OpportunityTable.from_opportunities(diverse_opportunities)
+
+    first = optimize_cached(cache, 'snap1', '0xabc', table, 0.01, 5000)
+    assert first == AllocationOptimizer(table, 0.01).optimize_allocation(5000)
+    assert optimize_cached(cache, 'snap1', '0xabc', table, 0.01, 5000) is first
+
+    assert optimize_cached(cache, 'snap1', '0xabc', table, 0.01, 6000) is not first
+    assert optimize_cached(cache, 'snap2', '0xabc', table, 0.01, 5000) is not first
+    assert optimize_cached(cache, 'snap1', '0xabc', table, 0.01, 5000, method="water_fill") is not first
+    assert (cache.hits, cache.misses) == (1, 4)
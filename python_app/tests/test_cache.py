@@ -0,0 +1,55 @@
+import threading
+from utils.cache import LRUCache, SharedLRUCache
+from utils.metrics import REGISTRY
+
+def test_lru_cache_evicts_least_recently_used():
+    """Test that the cache stays bounded and evicts the entry used longest ago."""
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # 'b' is now the least recently used
+    cache.put('c', 3)
+    
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.hit_rate == 2 / 3
+    
+    cache.clear()
+    assert len(cache) == 0 and cache.hit_rate == 0.0
+
+def test_shared_cache_computes_once_and_counts():
+    """Test that a shared cache reuses computed values and reports hits under its name."""
+    REGISTRY.reset()
+    cache = SharedLRUCache(maxsize=8, name='results')
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'value': len(calls)}
+
+    first = cache.get_or_compute('key', compute)
+    assert cache.get_or_compute('key', compute) is first
+    assert len(calls) == 1
+    assert cache.stats() == {'size': 1, 'maxsize': 8, 'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+    assert REGISTRY.counter_value('cache_hits_total', cache='results') == 1
+    assert REGISTRY.counter_value('cache_misses_total', cache='results') == 1
+
+def test_shared_cache_across_threads():
+    """Test that concurrent puts and gets keep the cache bounded and the counters exact."""
+    cache = SharedLRUCache(maxsize=50, name='threads')
+
+    def work(offset):
+        for i in range(500):
+            cache.put((offset, i % 100), i)
+            cache.get((offset, (i + 1) % 100))
+
+    threads = [threading.Thread(target=work, args=(offset,)) for offset in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(cache) == 50
+    assert cache.hits + cache.misses == 8 * 500
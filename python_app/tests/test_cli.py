@@ -0,0 +1,74 @@
+import csv
+import io
+import pytest
+import cli
+
+class FakeSnapshot:
+    """Deployment snapshot store holding fixed deployments at one block."""
+
+    def __init__(self, deployments, block):
+        self.deployments = deployments
+        self.block = block
+
+    def block_number(self):
+        return self.block
+
+    def iter_pages(self, page_size=10):
+        for start in range(0, len(self.deployments), page_size):
+            yield self.deployments[start:start + page_size]
+
+@pytest.fixture
+def offline_network(monkeypatch):
+    """Replace the network fetchers used by the CLI with fixed data."""
+    deployments = [
+        {'ipfsHash': f'hash{i}', 'signalAmount': str(1000 * 10**18), 'signalledTokens': str(10000 * (i + 1) * 10**18)}
+        for i in range(20)
+    ]
+    query_counts = {f'hash{i}': 100000 * (20 - i) for i in range(20)}
+    monkeypatch.setattr(cli, 'refresh_deployment_snapshot', lambda: FakeSnapshot(deployments, 100))
+    monkeypatch.setattr(cli, 'fetch_query_data', lambda: ({}, query_counts))
+    monkeypatch.setattr(cli, 'get_grt_price', lambda: 0.1)
+    monkeypatch.setattr(cli, 'get_account_balances', lambda wallets, block: {wallet: 50000.0 for wallet in wallets[:1]} if block == 100 else {})
+
+def test_optimize_wallets(offline_network):
+    """Test that each wallet gets its own allocation and unfunded wallets get none."""
+    results = cli.optimize_wallets(['0xaaa', '0xbbb'], method="water_fill")
+
+    assert [r['wallet'] for r in results] == ['0xaaa', '0xbbb']
+    assert 0 < results[0]['total_allocated'] <= 50000
+    assert results[1]['allocations'] == {}
+    assert all(r['block_number'] == 100 for r in results)
+
+def test_optimize_wallets_top_n(offline_network):
+    """Test that --top-n limits allocations to the best opportunities by current APR."""
+    results = cli.optimize_wallets(['0xaaa'], method="water_fill", top_n=3)
+
+    assert set(results[0]['allocations']) <= {'hash0', 'hash1', 'hash2'}
+    assert results[0]['total_allocated'] > 0
+
+def test_main_writes_csv(offline_network, tmp_path, capsys):
+    """Test the command-line entry point end to end with CSV output."""
+    output = tmp_path / 'allocations.csv'
+    wallets_file = tmp_path / 'wallets.txt'
+    wallets_file.write_text('# managed wallets\n0xAAA\n')
+
+    exit_code = cli.main(['--wallets-file', str(wallets_file), '--balance', '20000', '--format', 'csv', '--output', str(output)])
+
+    assert exit_code == 0
+    rows = list(csv.DictReader(io.StringIO(output.read_text())))
+    assert rows and all(row['wallet'] == '0xaaa' for row in rows)
+    assert sum(float(row['allocated_grt']) for row in rows) <= 20000 + 1e-6
+
+def test_main_fails_when_query_volume_is_unavailable(offline_network, monkeypatch, capsys):
+    """Test that a Supabase failure makes the run exit non-zero instead of printing empty allocations."""
+    def fail():
+        raise Exception("Error executing query: HTTP 503")
+    monkeypatch.setattr(cli, 'fetch_query_data', fail)
+
+    assert cli.main(['--wallet', '0xaaa']) == 1
+    captured = capsys.readouterr()
+    assert captured.out == '' and 'HTTP 503' in captured.err
+
+def test_main_without_wallets(capsys):
+    """Test that running without wallets is a usage error."""
+    assert cli.main([]) == 2
@@ -0,0 +1,242 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import api.graph_api as graph_api
+
+def make_deployments(count, seed=7):
+    """Create deployments with random 32-byte hex ids."""
+    rng = random.Random(seed)
+    return sorted(
+        (
+            {
+                'id': '0x' + ''.join(rng.choice('0123456789abcdef') for _ in range(64)),
+                'ipfsHash': f'Qm{i}',
+                'signalAmount': str(10**21),
+                'signalledTokens': str(10**21),
+                'stakedTokens': '0',
+                'queryFeesAmount': '0',
+                'queryFeeRebates': '0',
+                'deniedAt': 0
+            }
+            for i in range(count)
+        ),
+        key=lambda d: d['id']
+    )
+
+def serve_graphql(monkeypatch, respond):
+    """Serve GraphQL responses built by `respond(body)` from a local HTTP server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            payload = json.dumps({'data': respond(body)}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(graph_api, 'GRAPH_API_URL', f'http://127.0.0.1:{server.server_address[1]}/')
+    return server
+
+@pytest.fixture
+def graph_stub(monkeypatch):
+    """Serve subgraphDeployments pages from a local HTTP server."""
+    deployments = make_deployments(2500)
+    requests_seen = []
+
+    def respond(body):
+        query = body['query']
+        requests_seen.append(query)
+        lower = re.search(r'id_gt: "([^"]*)"', query).group(1)
+        upper = re.search(r'id_lt: "([^"]*)"', query)
+        page = [
+            d for d in deployments
+            if d['id'] > lower and (upper is None or d['id'] < upper.group(1))
+        ][:1000]
+        return {'subgraphDeployments': page}
+
+    server = serve_graphql(monkeypatch, respond)
+    yield deployments, requests_seen
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def wallet_stub(monkeypatch):
+    """Serve name signals and balances for 150 wallets with 20 signals each."""
+    wallets = [f'0x{i:040x}' for i in range(150)]
+    name_signals = sorted(
+        (
+            {
+                'id': f'{wallet}-{j:03d}',
+                'signal': str((j + 1) * 10**18),
+                'curator': {'id': wallet},
+                'subgraph': {'currentVersion': {'subgraphDeployment': {'ipfsHash': f'Qm{j}'}}}
+            }
+            for wallet in wallets
+            for j in range(20)
+        ),
+        key=lambda signal: signal['id']
+    )
+    requests_seen = []
+
+    def respond(body):
+        variables = body['variables']
+        requests_seen.append(variables)
+        accounts = [
+            {'id': wallet, 'balance': str(int(wallet, 16) * 10**18)}
+            for wallet in variables['wallets'] if int(wallet, 16) % 2 == 0
+        ]
+        data = {}
+        if variables['withSignals']:
+            data['signals'] = [
+                signal for signal in name_signals
+                if signal['curator']['id'] in variables['wallets'] and signal['id'] > variables['lastId']
+            ][:1000]
+        if variables['withBalances']:
+            data['accounts'] = accounts
+        return data
+
+    graph_api.get_wallet_data.clear()
+    server = serve_graphql(monkeypatch, respond)
+    yield wallets, requests_seen
+    server.shutdown()
+    server.server_close()
+
+def test_keyspace_ranges_cover_ids():
+    """Test that keyspace ranges are contiguous and unbounded at both ends."""
+    ranges = graph_api.keyspace_ranges(8)
+
+    assert len(ranges) == 8
+    assert ranges[0][0] == ""
+    assert ranges[-1][1] is None
+    for (_, upper), (lower, _) in zip(ranges, ranges[1:]):
+        assert upper == lower
+
+def test_serial_fetch_paginates(graph_stub):
+    """Test that a serial fetch pages through every deployment in id order."""
+    deployments, requests_seen = graph_stub
+
+    fetched = graph_api.fetch_deployments(graph_api.CURATABLE_FILTER)
+
+    assert [d['id'] for d in fetched] == [d['id'] for d in deployments]
+    assert len(requests_seen) == 4  # Three pages plus the empty one
+
+def test_parallel_fetch_matches_serial(graph_stub):
+    """Test that splitting the keyspace returns the same deployments in the same order."""
+    deployments, requests_seen = graph_stub
+
+    fetched = graph_api.fetch_deployments(graph_api.CURATABLE_FILTER, concurrency=8)
+
+    assert [d['id'] for d in fetched] == [d['id'] for d in deployments]
+    assert all(graph_api.CURATABLE_FILTER in query for query in requests_seen)
+
+def test_streamed_pages_cover_every_deployment(graph_stub):
+    """Test that concurrent streaming yields every deployment once, page by page."""
+    deployments, requests_seen = graph_stub
+
+    pages = list(graph_api.stream_deployment_pages(graph_api.CURATABLE_FILTER, concurrency=4))
+
+    assert all(0 < len(page) <= 1000 for page in pages)
+    assert sorted((d for page in pages for d in page), key=lambda d: d['id']) == deployments
+
+def test_closing_stream_stops_paging(graph_stub):
+    """Test that a consumer which stops early does not page through the rest."""
+    _, requests_seen = graph_stub
+
+    pages = graph_api.stream_deployment_pages(graph_api.CURATABLE_FILTER)
+    next(pages)
+    pages.close()
+
+    assert len(requests_seen) == 1
+
+def test_stream_buffers_a_bounded_number_of_pages(monkeypatch):
+    """Test that ranges stop paging ahead of a slow consumer, and that closing never deadlocks."""
+    produced = []
+
+    def iter_pages(where, lower="", upper=None, block=None):
+        for i in range(100):
+            produced.append(lower)
+            yield [{'id': f'{lower}-{i}'}]
+
+    monkeypatch.setattr(graph_api, 'iter_deployment_pages', iter_pages)
+    pages = graph_api.stream_deployment_pages(graph_api.CURATABLE_FILTER, concurrency=2)
+    next(pages)
+    time.sleep(0.3)
+
+    # One page consumed, four queued, and at most one more waiting in each range
+    assert len(produced) <= 1 + 4 + 2
+    pages.close()
+
+def test_batched_curation_signals(wallet_stub):
+    """Test that signals for many wallets are paged in batches and keyed by wallet."""
+    wallets, requests_seen = wallet_stub
+
+    signals = graph_api.get_user_curation_signals([wallet.upper().replace('0X', '0x') for wallet in wallets[:130]])
+
+    assert set(signals) == set(wallets[:130])
+    assert signals[wallets[3]] == {f'Qm{j}': float(j + 1) for j in range(20)}
+    # Batches of 100 and 30 wallets: 2000 signals end on an empty page, 600 on a short first page
+    assert len(requests_seen) == 4
+
+def test_batched_account_balances(wallet_stub):
+    """Test that balances default to zero for wallets without a graph account."""
+    wallets, requests_seen = wallet_stub
+
+    balances = graph_api.get_account_balances(wallets)
+
+    assert balances[wallets[4]] == 4.0
+    assert balances[wallets[5]] == 0.0
+    # One balances-only request per batch of 100 wallets
+    assert len(requests_seen) == 2
+    assert not any(request['withSignals'] for request in requests_seen)
+    assert graph_api.get_account_balance(wallets[6]) == 6.0
+
+def test_wallet_data_in_one_request(wallet_stub):
+    """Test that signals and balance share one request and one cache entry."""
+    wallets, requests_seen = wallet_stub
+
+    assert graph_api.get_user_curation_signal(wallets[4].upper().replace('0X', '0x')) == {f'Qm{j}': float(j + 1) for j in range(20)}
+    assert graph_api.get_account_balance(wallets[4]) == 4.0
+    assert graph_api.get_account_balance(wallets[5]) == 0.0
+    assert len(requests_seen) == 2  # One per wallet; the second lookup of wallet 4 is cached
+
+def test_wallet_data_pages_signals_only(wallet_stub):
+    """Test that later signal pages of a batch skip the balance root."""
+    wallets, requests_seen = wallet_stub
+
+    signals, balances = graph_api.get_wallet_data(wallets[:60])
+
+    assert all(len(signals[wallet]) == 20 for wallet in wallets[:60])
+    assert balances[wallets[2]] == 2.0
+    # 1200 signals fit in two pages; only the first asks for balances
+    assert [request['withBalances'] for request in requests_seen] == [True, False]
+
+def test_wallet_data_pinned_to_block(wallet_stub):
+    """Test that a pinned lookup sends the block and is cached apart from the latest one."""
+    wallets, requests_seen = wallet_stub
+
+    graph_api.get_wallet_data(wallets[:1], 123)
+    graph_api.get_wallet_data(wallets[:1])
+
+    assert [request['block'] for request in requests_seen] == [{'number': 123}, None]
+
+def test_snapshot_ahead_of_block_reports_its_block(monkeypatch, tmp_path):
+    """Test that a store already past the requested block is kept and reports the block it is at."""
+    deployments = make_deployments(3)
+    monkeypatch.setattr(graph_api, 'SNAPSHOT_DB_PATH', str(tmp_path / 'snapshot.sqlite'))
+    monkeypatch.setattr(graph_api, 'GRAPH_API_URL', 'http://127.0.0.1:9/')  # Any query fails
+    graph_api.DeploymentSnapshotStore(graph_api.SNAPSHOT_DB_PATH).replace_all(deployments, block_number=120)
+
+    fetched, block = graph_api.get_pinned_deployments(100)
+
+    assert block == 120
+    assert [d['id'] for d in fetched] == [d['id'] for d in deployments]
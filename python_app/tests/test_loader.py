@@ -0,0 +1,32 @@
+import threading
+import pytest
+from api.loader import fetch_concurrently
+from utils.metrics import REGISTRY
+
+def test_sources_run_concurrently():
+    """Test that every source is in flight at the same time."""
+    barrier = threading.Barrier(3, timeout=5)
+
+    def source(value):
+        def fetch():
+            barrier.wait()  # Only passes once all three sources are running
+            return value
+        return fetch
+
+    futures = fetch_concurrently({name: source(name) for name in ('a', 'b', 'c')})
+
+    assert {name: future.result(timeout=5) for name, future in futures.items()} == {'a': 'a', 'b': 'b', 'c': 'c'}
+
+def test_failure_stays_with_its_source():
+    """Test that one failing source does not affect the others."""
+    REGISTRY.reset()
+
+    def fail():
+        raise Exception("gateway down")
+
+    futures = fetch_concurrently({'price': lambda: 0.1, 'signals': fail})
+
+    assert futures['price'].result(timeout=5) == 0.1
+    with pytest.raises(Exception, match="gateway down"):
+        futures['signals'].result(timeout=5)
+    assert REGISTRY.counter_value('load_errors_total', source='signals') == 1
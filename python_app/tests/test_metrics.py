@@ -0,0 +1,88 @@
+import pstats
+import threading
+from utils.metrics import MetricsRegistry, REGISTRY, Histogram, profiled, span, timed
+
+def test_histogram_buckets_and_quantiles():
+    """Test cumulative bucket counts and bucket-resolution quantiles."""
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 5.0):
+        histogram.observe(value)
+    
+    summary = histogram.summary()
+    assert summary['buckets'] == {'0.1': 2, '1.0': 3, '+Inf': 4}
+    assert summary['count'] == 4 and summary['sum'] == 5.6
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.99) == float('inf')
+
+def test_prometheus_export():
+    """Test counters and histograms in the Prometheus text format."""
+    registry = MetricsRegistry()
+    registry.counter('pages_total', 3, source='graph')
+    registry.counter('pages_total', 2, source='graph')
+    registry.histogram('span_seconds', buckets=(1.0,), span='fetch').observe(0.5)
+    
+    text = registry.to_prometheus()
+    assert '# TYPE pages_total counter\npages_total{source="graph"} 5\n' in text
+    assert 'span_seconds_bucket{span="fetch",le="1.0"} 1' in text
+    assert 'span_seconds_count{span="fetch"} 1' in text
+    assert registry.to_json()['counters']['pages_total'] == {'{source="graph"}': 5}
+
+def test_spans_and_timed_functions():
+    """Test that spans and decorated functions are timed under their names."""
+    @timed('tests.work')
+    def work():
+        with span('tests.inner'):
+            return 42
+    
+    before = REGISTRY.histogram('span_seconds', span='tests.work').count
+    assert work() == 42
+    assert REGISTRY.histogram('span_seconds', span='tests.work').count == before + 1
+    assert REGISTRY.histogram('span_seconds', span='tests.inner').count >= 1
+
+def test_profiled_capture_modes(tmp_path):
+    """Test the cProfile and tracemalloc capture modes."""
+    with profiled('tests.cpu', mode='cprofile', output_dir=str(tmp_path)):
+        sum(range(10000))
+    profiles = list(tmp_path.glob('tests.cpu-*.prof'))
+    assert len(profiles) == 1
+    assert pstats.Stats(str(profiles[0])).total_calls > 0
+    
+    with profiled('tests.memory', mode='tracemalloc'):
+        block = bytearray(2**20)
+    assert REGISTRY.histogram('peak_memory_bytes', span='tests.memory').summary()['sum'] >= 2**20
+    
+    with profiled('tests.off', mode=None):
+        pass
+
+def test_profiled_one_session_at_a_time(tmp_path):
+    """Test that a block overlapping a profiled one runs unprofiled and neither fails."""
+    for mode in ('tracemalloc', 'cprofile'):
+        inside, release = threading.Event(), threading.Event()
+        errors = []
+
+        def first():
+            try:
+                with profiled('tests.first', mode=mode, output_dir=str(tmp_path)):
+                    inside.set()
+                    release.wait(5)
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=first)
+        thread.start()
+        inside.wait(5)
+        skipped = REGISTRY.counter_value('profiles_skipped_total', span='tests.second')
+        with profiled('tests.second', mode=mode, output_dir=str(tmp_path)):
+            pass
+        release.set()
+        thread.join()
+
+        assert errors == []
+        assert REGISTRY.counter_value('profiles_skipped_total', span='tests.second') == skipped + 1
+    
+    # Runs in the same second still get a file each
+    for _ in range(2):
+        with profiled('tests.first', mode='cprofile', output_dir=str(tmp_path)):
+            pass
+    assert len(list(tmp_path.glob('tests.first-*.prof'))) == 3
+    assert not list(tmp_path.glob('tests.second-*.prof'))
@@ -0,0 +1,79 @@
+import pytest
+import numpy as np
+from models.opportunities import Opportunity, OpportunityTable, calculate_opportunities, calculate_opportunities_streaming
+
+@pytest.fixture
+def sample_deployments():
+    """Create raw deployments as returned by the network subgraph."""
+    return [
+        {'ipfsHash': 'hash1', 'signalAmount': str(1000 * 10**18), 'signalledTokens': str(10000 * 10**18)},
+        {'ipfsHash': 'hash2', 'signalAmount': str(2000 * 10**18), 'signalledTokens': str(4000 * 10**18)},
+        {'ipfsHash': 'hash3', 'signalAmount': '0', 'signalledTokens': str(5000 * 10**18)},
+        {'ipfsHash': 'no_queries', 'signalAmount': str(500 * 10**18), 'signalledTokens': str(500 * 10**18)}
+    ]
+
+@pytest.fixture
+def sample_query_counts():
+    """Create weekly query counts keyed by IPFS hash."""
+    return {'hash1': 100000, 'hash2': 50000, 'hash3': 70000}
+
+def test_calculate_opportunities(sample_deployments, sample_query_counts):
+    """Test that opportunities are filtered, computed and sorted by APR."""
+    grt_price = 0.1
+    table = calculate_opportunities(sample_deployments, {}, sample_query_counts, grt_price)
+
+    assert isinstance(table, OpportunityTable)
+    assert list(table.ipfs_hash) == ['hash2', 'hash1']
+
+    opp = table[1]
+    assert isinstance(opp, Opportunity)
+    assert opp.annual_queries == 100000 * 52
+    assert opp.curator_share == pytest.approx(100000 * 52 / 100000 * 4 * 0.1)
+    assert opp.estimated_earnings == pytest.approx(opp.curator_share * 1000 / 10000)
+    assert opp.apr == pytest.approx(opp.estimated_earnings / (1000 * grt_price) * 100)
+
+def test_table_round_trip(sample_deployments, sample_query_counts):
+    """Test that row views match the Opportunity objects a table was built from."""
+    table = calculate_opportunities(sample_deployments, {}, sample_query_counts, 0.1)
+    rows = list(table)
+    rebuilt = OpportunityTable.from_opportunities(rows)
+
+    assert list(rebuilt) == rows
+    assert OpportunityTable.from_opportunities(table) is table
+    assert len(table[:1]) == 1
+
+def test_vectorized_apr_matches_row_formula(sample_deployments, sample_query_counts):
+    """Test vectorized APR after additional signal against the scalar formula."""
+    grt_price = 0.1
+    table = calculate_opportunities(sample_deployments, {}, sample_query_counts, grt_price)
+    additional = np.array([100.0, 250.0])
+
+    aprs = table.apr_with(grt_price, additional)
+    for opp, extra, apr in zip(table, additional, aprs):
+        signal_amount = opp.signal_amount + extra
+        signalled_tokens = opp.signalled_tokens + extra
+        expected = opp.curator_share * (signal_amount / signalled_tokens) / (signal_amount * grt_price) * 100
+        assert apr == pytest.approx(expected)
+
+def test_streaming_matches_batch():
+    """Test that streamed pages give the batch result, cut to top_n with ties in arrival order."""
+    rng = np.random.default_rng(3)
+    deployments = [
+        {
+            'ipfsHash': f'hash{i}',
+            'signalAmount': str(int(rng.integers(0, 5000)) * 10**18),
+            'signalledTokens': str(10000 * 10**18),
+        }
+        for i in range(500)
+    ]
+    query_counts = {f'hash{i}': int(rng.integers(1, 20)) * 10000 for i in range(0, 500, 2)}
+    pages = [deployments[i:i + 37] for i in range(0, len(deployments), 37)]
+    expected = calculate_opportunities(deployments, {}, query_counts, 0.1)
+
+    streamed = calculate_opportunities_streaming(iter(pages), query_counts, 0.1)
+    assert list(streamed) == list(expected)
+
+    top = calculate_opportunities_streaming(iter(pages), query_counts, 0.1, top_n=25)
+    assert list(top) == list(expected[:25])
+
+    assert len(calculate_opportunities_streaming(iter([]), query_counts, 0.1, top_n=5)) == 0
@@ -0,0 +1,60 @@
+import os
+import numpy as np
+import pytest
+import api.refresher as refresher_module
+from api.opportunity_store import current_snapshot_id, load_opportunities, prune_snapshots, publish_opportunities
+from models.opportunities import calculate_opportunities
+from tests.test_refresher import FakeNetwork
+
+@pytest.fixture
+def table():
+    """An opportunity table over 50 deployments."""
+    deployments = [
+        {'ipfsHash': f'Qm{i:03d}', 'signalAmount': str(1000 * 10**18), 'signalledTokens': str(10000 * (i + 1) * 10**18)}
+        for i in range(50)
+    ]
+    return calculate_opportunities(deployments, {}, {f'Qm{i:03d}': 1000 * (50 - i) for i in range(50)}, 0.1)
+
+def test_publish_and_map(table, tmp_path):
+    """Test that a published table maps back read-only with identical rows."""
+    directory = str(tmp_path)
+    publish_opportunities(table, 'snap1', directory)
+
+    mapped = load_opportunities(directory)
+    assert current_snapshot_id(directory) == 'snap1'
+    assert list(mapped) == list(table)
+    assert mapped.position(table.ipfs_hash[7]) == 7
+    assert isinstance(mapped.apr.base, np.memmap) and isinstance(mapped.ipfs_hash, np.memmap)  # Views of the files, not copies
+    assert not mapped.apr.flags.writeable
+
+    with pytest.raises(FileNotFoundError):
+        load_opportunities(directory, 'missing')
+
+def test_republish_and_prune(table, tmp_path):
+    """Test that publishing an existing id only moves CURRENT and pruning spares the current snapshot."""
+    directory = str(tmp_path)
+    for snapshot_id in ('snap1', 'snap2', 'snap3', 'snap1'):
+        publish_opportunities(table, snapshot_id, directory)
+    os.utime(os.path.join(directory, 'snap1'), (0, 0))  # Oldest, yet current
+
+    assert prune_snapshots(directory, keep=1) == ['snap2']
+    assert sorted(entry for entry in os.listdir(directory) if not entry.startswith('.')) == ['CURRENT', 'snap1', 'snap3']
+    assert len(load_opportunities(directory)) == len(table)
+
+def test_refreshers_share_published_snapshot(tmp_path, monkeypatch):
+    """Test that a second process's refresher maps the first one's snapshot instead of recomputing it."""
+    network = FakeNetwork()
+    first = network.refresher()
+    first.snapshot_dir = str(tmp_path)
+    published = first.refresh()
+
+    def fail(*args):
+        raise AssertionError("opportunities were recomputed")
+
+    monkeypatch.setattr(refresher_module, 'calculate_opportunities', fail)
+    second = network.refresher()
+    second.snapshot_dir = str(tmp_path)
+    attached = second.refresh()
+
+    assert attached.snapshot_id == published.snapshot_id
+    assert list(attached.opportunities) == list(published.opportunities)
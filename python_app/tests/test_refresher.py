@@ -0,0 +1,151 @@
+import threading
+from api.refresher import NetworkRefresher, network_state_id
+
+def deployment(ipfs_hash, signalled_tokens):
+    return {'ipfsHash': ipfs_hash, 'signalAmount': str(10**21), 'signalledTokens': str(signalled_tokens * 10**18)}
+
+class FakeNetwork:
+    """Network sources that can be changed, failed or held open from a test."""
+
+    def __init__(self):
+        self.deployments = [deployment('hash1', 10000), deployment('hash2', 20000)]
+        self.query_counts = {'hash1': 100000, 'hash2': 50000}
+        self.grt_price = 0.1
+        self.block = 100
+        self.store_block = 0  # Block the deployment store is already at
+        self.blocks_read = []
+        self.fail_price = False
+        self.release = threading.Event()
+        self.release.set()
+
+    def fetch_block(self):
+        return self.block
+
+    def fetch_deployments(self, block):
+        self.release.wait()
+        self.blocks_read.append(block)
+        return list(self.deployments), max(block, self.store_block)
+
+    def fetch_query_data(self):
+        return {}, dict(self.query_counts)
+
+    def fetch_grt_price(self):
+        if self.fail_price:
+            raise Exception("price feed down")
+        return self.grt_price
+
+    def refresher(self):
+        return NetworkRefresher(
+            interval=3600,
+            fetch_block=self.fetch_block,
+            fetch_deployments=self.fetch_deployments,
+            fetch_query_data=self.fetch_query_data,
+            fetch_grt_price=self.fetch_grt_price
+        )
+
+def test_refresh_publishes_snapshots():
+    """Test that each refresh publishes a new versioned snapshot with opportunities computed."""
+    network = FakeNetwork()
+    refresher = network.refresher()
+    assert refresher.snapshot(timeout=0) is None
+
+    first = refresher.refresh()
+    assert first.version == 1
+    assert [opp.ipfs_hash for opp in first.opportunities] == ['hash1', 'hash2']
+
+    network.block += 1
+    network.deployments.append(deployment('hash3', 5000))
+    network.query_counts['hash3'] = 200000
+    second = refresher.refresh()
+    assert second.version == 2
+    assert len(second.opportunities) == 3
+    assert len(first.opportunities) == 2  # Published snapshots never change
+
+def test_failed_source_keeps_last_good_value():
+    """Test that a failing source keeps its previous value instead of breaking the snapshot."""
+    network = FakeNetwork()
+    refresher = network.refresher()
+    refresher.refresh()
+
+    network.fail_price = True
+    network.block += 1
+    network.deployments.append(deployment('hash3', 5000))
+    snapshot = refresher.refresh()
+    assert snapshot.version == 2
+    assert snapshot.grt_price == 0.1
+    assert len(snapshot.deployments) == 3
+    assert str(refresher.last_error) == "price feed down"
+
+def test_readers_do_not_wait_for_refresh():
+    """Test that readers get the current snapshot while a background refresh is in flight."""
+    network = FakeNetwork()
+    refresher = network.refresher()
+    refresher.refresh()
+
+    network.release.clear()
+    network.block += 1
+    refresher.start()  # Blocks inside fetch_deployments
+    try:
+        assert refresher.snapshot(timeout=0).version == 1
+    finally:
+        network.release.set()
+        refresher.stop(timeout=5)
+    assert refresher.snapshot().version == 2
+
+def test_snapshot_is_none_when_first_refresh_fails():
+    """Test that readers stop waiting when the first refresh can't build a snapshot."""
+    network = FakeNetwork()
+    network.fail_price = True
+    refresher = network.refresher().start()
+    try:
+        assert refresher.snapshot(timeout=5) is None
+    finally:
+        refresher.stop(timeout=5)
+
+def test_sources_are_fetched_concurrently():
+    """Test that deployments and the price are in flight at the same time."""
+    network = FakeNetwork()
+    barrier = threading.Barrier(2, timeout=5)  # Breaks, failing both sources, if they run one after another
+
+    def together(fetch):
+        def run(*args):
+            barrier.wait()
+            return fetch(*args)
+        return run
+
+    network.fetch_deployments = together(network.fetch_deployments)
+    network.fetch_grt_price = together(network.fetch_grt_price)
+
+    snapshot = network.refresher().refresh()
+
+    assert snapshot is not None
+    assert snapshot.grt_price == 0.1 and len(snapshot.deployments) == 2
+
+def test_unchanged_network_keeps_snapshot():
+    """Test that a refresh at the same block, volume and price reuses the current snapshot."""
+    network = FakeNetwork()
+    refresher = network.refresher()
+    first = refresher.refresh()
+    assert first.block_number == 100 and network.blocks_read == [100]
+
+    assert refresher.refresh() is first  # Same id: no new version, no recompute
+
+    network.query_counts['hash1'] += 1  # The volume window moved
+    second = refresher.refresh()
+    assert second.version == 2 and second.snapshot_id != first.snapshot_id
+
+    network.block += 1
+    third = refresher.refresh()
+    assert third.block_number == 101 and third.snapshot_id != second.snapshot_id
+    assert network.blocks_read == [100, 100, 100, 101]
+
+def test_snapshot_takes_block_of_store_ahead_of_request():
+    """Test that deployments read past the requested block are labelled with the block they were read at."""
+    network = FakeNetwork()
+    refresher = network.refresher()
+    network.store_block = 120  # Another process advanced the store, or the gateway reported a lagging block
+    snapshot = refresher.refresh()
+
+    assert network.blocks_read == [100]
+    assert snapshot.block_number == 120
+    assert snapshot.snapshot_id == network_state_id(120, network.query_counts, network.grt_price)
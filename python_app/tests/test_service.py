@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import pytest
+from api.refresher import NetworkRefresher
+from service import AllocationService, RequestCoalescer, serve
+from utils.metrics import REGISTRY
+
+@pytest.fixture
+def service():
+    """A service over a fixed 20-deployment network and fake wallet lookups."""
+    deployments = [
+        {'ipfsHash': f'hash{i}', 'signalAmount': str(1000 * 10**18), 'signalledTokens': str(10000 * (i + 1) * 10**18)}
+        for i in range(20)
+    ]
+    query_counts = {f'hash{i}': 100000 * (20 - i) for i in range(20)}
+    refresher = NetworkRefresher(
+        fetch_block=lambda: 100,
+        fetch_deployments=lambda block: (deployments, block),
+        fetch_query_data=lambda: ({}, query_counts),
+        fetch_grt_price=lambda: 0.1
+    )
+    refresher.refresh()
+    REGISTRY.reset()
+    return AllocationService(
+        refresher,
+        fetch_user_signals=lambda wallet, block: {'hash0': 500.0, 'hash3': 250.0},
+        fetch_balance=lambda wallet, block: 20000.0
+    )
+
+def test_coalescer_runs_identical_requests_once():
+    """Test that concurrent callers with the same key share one computation."""
+    coalescer = RequestCoalescer()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {'answer': 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescer.run('key', compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    while coalescer.coalesced < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [{'answer': 42}] * 5
+    assert coalescer.run('key', lambda: {'answer': 43}) == {'answer': 43}  # Finished calls aren't reused
+
+def test_allocation_endpoint(service):
+    """Test the allocation endpoint with an explicit and an on-chain balance."""
+    status, body = service.handle('/wallets/0xABC/allocation', {'balance': ['5000'], 'method': ['water_fill']})
+    assert status == 200
+    assert body['wallet'] == '0xabc'
+    assert body['snapshot_version'] == 1
+    assert 0 < body['total_allocated'] <= 5000 + 1e-6
+
+    status, body = service.handle('/wallets/0xabc/allocation', {})
+    assert status == 200 and body['available_grt'] == 20000.0
+
+    assert service.handle('/wallets/0xabc/allocation', {'method': ['simplex']})[0] == 400
+    assert service.handle('/wallets/0xabc/allocation', {'balance': ['lots']})[0] == 400
+    assert service.handle('/nowhere', {})[0] == 404
+    assert service.latency['allocation'].count == 4
+
+    status, body = service.handle('/wallets/0xabc/allocation', {'method': ['greedy'], 'max_positions': ['2']})
+    assert status == 400 and 'exact' in body['error']
+    status, body = service.handle('/wallets/0xabc/allocation', {'balance': ['5000'], 'method': ['exact'], 'max_positions': ['2']})
+    assert status == 200 and len(body['allocations']) <= 2
+
+def test_allocation_rejects_bad_numbers(service):
+    """Test that non-finite balances, negative limits and non-positive max_positions are client errors."""
+    for balance in ('inf', '-inf', 'nan'):
+        status, body = service.handle('/wallets/0xabc/allocation', {'balance': [balance]})
+        assert status == 400 and 'finite' in body['error']
+    for max_positions in ('0', '-2'):
+        status, _ = service.handle('/wallets/0xabc/allocation', {'method': ['exact'], 'max_positions': [max_positions]})
+        assert status == 400
+
+    assert service.handle('/opportunities', {'limit': ['-3']})[0] == 400
+    status, body = service.handle('/opportunities', {'limit': ['0']})
+    assert status == 200 and body['opportunities'] == []
+
+def test_allocation_results_are_cached(service):
+    """Test that a repeated allocation on the same snapshot is served from the result cache."""
+    first = service.handle('/wallets/0xabc/allocation', {'balance': ['5000']})[1]
+    second = service.handle('/wallets/0xabc/allocation', {'balance': ['5000']})[1]
+
+    assert first == second
+    assert service.metrics()['result_cache']['hits'] == 1
+    assert service.metrics()['result_cache']['size'] == 1
+
+def test_http_round_trip(service):
+    """Test the service over a real socket, including the metrics endpoint."""
+    server = serve(service, '127.0.0.1', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    try:
+        with urllib.request.urlopen(f'{base}/wallets/0xabc/opportunities') as response:
+            body = json.load(response)
+        assert [opp['ipfs_hash'] for opp in body['opportunities']] == ['hash0', 'hash3']
+
+        with urllib.request.urlopen(f'{base}/opportunities?limit=5') as response:
+            assert len(json.load(response)['opportunities']) == 5
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f'{base}/opportunities?limit=x')
+        assert error.value.code == 400
+
+        with urllib.request.urlopen(f'{base}/metrics') as response:
+            metrics = json.load(response)
+        assert metrics['latency_seconds']['user_opportunities']['count'] == 1
+        assert metrics['latency_seconds']['opportunities']['buckets']['+Inf'] == 2
+        assert 'span_seconds' in metrics['process']['histograms']
+
+        with urllib.request.urlopen(f'{base}/metrics?format=prometheus') as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            text = response.read().decode()
+        assert 'service_request_seconds_count{route="user_opportunities"} 1' in text
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,49 @@
+import pytest
+from models.opportunities import Opportunity, calculate_signal_distribution
+from models.signals import calculate_optimal_allocations
+
+def reference_distribution(opportunities, total_signal, grt_price):
+    """Rescan every opportunity on every 100 GRT step, as the original loop did."""
+    allocations = {opp.ipfs_hash: 0 for opp in opportunities}
+    remaining_signal = total_signal
+    while remaining_signal > 0:
+        best_apr = -1
+        best_opp = None
+        for opp in opportunities:
+            new_signal_amount = opp.signal_amount + allocations[opp.ipfs_hash] + 100
+            new_signalled_tokens = opp.signalled_tokens + allocations[opp.ipfs_hash] + 100
+            apr = (opp.curator_share * (new_signal_amount / new_signalled_tokens) / (new_signal_amount * grt_price)) * 100
+            if apr > best_apr:
+                best_apr = apr
+                best_opp = opp
+        if not best_opp:
+            break
+        allocations[best_opp.ipfs_hash] += min(100, remaining_signal)
+        remaining_signal -= 100
+    return allocations
+
+@pytest.fixture
+def opportunities():
+    """Create opportunities with distinct and tied next-step APRs."""
+    return [
+        Opportunity("hash1", 1000, 10000, 1000000, 40, 4, 0.4, 5.0, 19230),
+        Opportunity("hash2", 2000, 20000, 2000000, 80, 8, 0.8, 4.0, 38460),
+        Opportunity("hash3", 500, 5000, 500000, 20, 2, 0.2, 6.0, 9615),
+        Opportunity("hash4", 500, 5000, 500000, 20, 2, 0.2, 6.0, 9615),
+        Opportunity("hash5", 0, 2000, 5000000, 200, 20, 0.0, 0.0, 96150)
+    ]
+
+@pytest.mark.parametrize("total_signal", [0, 50, 1000, 12345.5, 50000])
+def test_signal_distribution_matches_reference(opportunities, total_signal):
+    """Test that the heap-based distribution matches a full rescan per step."""
+    grt_price = 0.1
+    assert calculate_signal_distribution(opportunities, total_signal, grt_price) == \
+        reference_distribution(opportunities, total_signal, grt_price)
+
+def test_optimal_allocations_respect_subgraph_limit(opportunities):
+    """Test that only the top opportunities receive signal and the total is used."""
+    user_signals = {"hash2": 500}
+    allocations = calculate_optimal_allocations(opportunities, user_signals, 10000, 0.1, 3)
+
+    assert set(allocations) == {"hash3", "hash4", "hash1"}
+    assert sum(allocations.values()) == 10000
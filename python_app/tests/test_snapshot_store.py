@@ -0,0 +1,65 @@
+import pytest
+from api.snapshot_store import DeploymentSnapshotStore
+from api.graph_api import is_curatable
+
+def make_deployment(deployment_id, signalled_grt, denied_at=0):
+    """Create a deployment dict as returned by the network subgraph."""
+    return {
+        'id': deployment_id,
+        'ipfsHash': f'Qm{deployment_id}',
+        'signalAmount': str(signalled_grt * 10**18),
+        'signalledTokens': str(signalled_grt * 10**18),
+        'stakedTokens': '0',
+        'queryFeesAmount': '0',
+        'queryFeeRebates': '0',
+        'deniedAt': denied_at
+    }
+
+def test_empty_store(tmp_path):
+    """Test that a new store has no block and no deployments."""
+    store = DeploymentSnapshotStore(str(tmp_path / 'snapshot.sqlite'))
+
+    assert store.block_number() is None
+    assert store.load() == []
+
+def test_replace_and_merge(tmp_path):
+    """Test a full snapshot followed by an incremental merge."""
+    path = str(tmp_path / 'nested' / 'snapshot.sqlite')
+    store = DeploymentSnapshotStore(path)
+    store.replace_all([make_deployment('0x02', 500), make_deployment('0x01', 200)], block_number=100)
+
+    assert store.block_number() == 100
+    assert [d['id'] for d in store.load()] == ['0x01', '0x02']
+
+    changed = [
+        make_deployment('0x01', 50),         # Dropped below the signal threshold
+        make_deployment('0x02', 900),        # Signal increased
+        make_deployment('0x03', 300),        # Newly curatable
+        make_deployment('0x04', 300, 12345)  # Denied
+    ]
+    store.merge(changed, block_number=120, keep=is_curatable)
+
+    # A fresh store on the same file sees the merged snapshot
+    reloaded = DeploymentSnapshotStore(path)
+    deployments = reloaded.load()
+    assert reloaded.block_number() == 120
+    assert [d['id'] for d in deployments] == ['0x02', '0x03']
+    assert deployments[0]['signalledTokens'] == str(900 * 10**18)
+    assert 'deniedAt' not in deployments[0]
+
+def test_streamed_replace_and_pages(tmp_path):
+    """Test replacing from a generator and reading the snapshot back in pages."""
+    store = DeploymentSnapshotStore(str(tmp_path / 'snapshot.sqlite'))
+    store.replace_all((make_deployment(f'0x{i:02x}', 200) for i in reversed(range(5))), block_number=7)
+
+    pages = list(store.iter_pages(page_size=2))
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [d['id'] for page in pages for d in page] == [d['id'] for d in store.load()]
+
+    def failing():
+        yield make_deployment('0x10', 200)
+        raise Exception("page fetch failed")
+
+    with pytest.raises(Exception):
+        store.replace_all(failing(), block_number=8)
+    assert store.block_number() == 7 and len(store.load()) == 5  # Nothing was replaced
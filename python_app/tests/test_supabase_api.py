@@ -0,0 +1,147 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+import pytest
+from api.postgres import stream_hourly_volume, timestamp_literal
+import api.supabase_api as supabase_api
+from api.supabase_api import HourlyVolumeWindow
+
+class FakeHourlyTable:
+    """Stand-in for qos_hourly_query_volume that records every `since` it is asked for."""
+
+    def __init__(self):
+        self.rows = []
+        self.requests = []
+
+    def add(self, ipfs_hash, end_epoch, fees, count):
+        self.rows.append({
+            'subgraph_deployment_ipfs_hash': ipfs_hash,
+            'end_epoch': end_epoch.isoformat() + '+00:00',
+            'total_query_fees': str(fees),
+            'query_count': str(count)
+        })
+
+    def fetch(self, since):
+        self.requests.append(since)
+        return [row for row in self.rows if datetime.fromisoformat(row['end_epoch'][:-6]) >= since]
+
+def test_hourly_window_fetches_deltas_and_evicts():
+    """Test that refreshes only ask for new hours and drop hours outside the window."""
+    start = datetime(2024, 1, 1)
+    table = FakeHourlyTable()
+    for hour in range(1, 169):
+        table.add('hash1', start + timedelta(hours=hour), 1.0, 10)
+    table.add('hash2', start + timedelta(hours=168), 2.0, 5)
+
+    window = HourlyVolumeWindow(fetch_hours=table.fetch)
+    now = start + timedelta(hours=168, minutes=5)
+    window.refresh(now)
+
+    query_fees, query_counts = window.totals()
+    assert table.requests == [now - timedelta(days=7)]
+    assert query_counts == {'hash1': 1680, 'hash2': 5}
+    assert query_fees['hash2'] == 2.0
+
+    # The newest hour gets more rows, and a new hour arrives
+    table.rows = [row for row in table.rows if row['subgraph_deployment_ipfs_hash'] != 'hash2']
+    table.add('hash2', start + timedelta(hours=168), 3.0, 7)
+    table.add('hash2', start + timedelta(hours=169), 1.0, 1)
+    later = now + timedelta(hours=1)
+    window.refresh(later)
+
+    query_fees, query_counts = window.totals()
+    assert table.requests[-1] == start + timedelta(hours=168)
+    assert query_counts == {'hash1': 1670, 'hash2': 8}  # hash1's first hour fell out of the window
+    assert query_fees['hash2'] == 4.0
+    assert window.high_water_mark == start + timedelta(hours=169)
+
+def test_hourly_window_staleness():
+    """Test that the window reports when it is due for a refresh."""
+    window = HourlyVolumeWindow(fetch_hours=lambda since: [])
+    now = datetime(2024, 1, 1)
+
+    assert window.is_stale(300, now)
+    window.refresh(now)
+    assert not window.is_stale(300, now + timedelta(seconds=299))
+    assert window.is_stale(300, now + timedelta(seconds=300))
+
+def test_failed_refresh_keeps_last_totals(monkeypatch):
+    """Test that a failing refresh reports the error and keeps serving the last good totals."""
+    table = FakeHourlyTable()
+    table.add('hash1', supabase_api.utc_now() - timedelta(hours=1), 1.5, 10)
+    calls = []
+
+    def fetch(since):
+        calls.append(since)
+        if len(calls) > 1:
+            raise Exception("connection refused")
+        return table.fetch(since)
+
+    errors = []
+    monkeypatch.setattr(supabase_api, '_volume_window', HourlyVolumeWindow(fetch_hours=fetch))
+    monkeypatch.setattr(supabase_api, 'QUERY_VOLUME_REFRESH_INTERVAL', 0)
+    monkeypatch.setattr(supabase_api, 'report_error', errors.append)
+
+    assert supabase_api.process_query_data() == ({'hash1': 1.5}, {'hash1': 10})
+    assert supabase_api.process_query_data() == ({'hash1': 1.5}, {'hash1': 10})
+    assert len(calls) == 2 and len(errors) == 1
+
+def test_failed_first_refresh_returns_nothing(monkeypatch):
+    """Test that without a successful refresh a failure returns empty totals."""
+    def fetch(since):
+        raise Exception("connection refused")
+
+    monkeypatch.setattr(supabase_api, '_volume_window', HourlyVolumeWindow(fetch_hours=fetch))
+    monkeypatch.setattr(supabase_api, 'report_error', lambda message: None)
+
+    assert supabase_api.process_query_data() == ({}, {})
+
+def test_window_streams_from_database():
+    """Test the parameterized streaming path against a SQLite stand-in for Postgres."""
+    conn = sqlite3.connect(':memory:')
+    conn.execute("""
+        CREATE TABLE qos_hourly_query_volume (
+            subgraph_deployment_ipfs_hash TEXT,
+            total_query_fees REAL,
+            query_count INTEGER,
+            end_epoch TEXT
+        )
+    """)
+    start = datetime(2024, 1, 1)
+    rows = [
+        (f'hash{i % 3}', 0.5, 10, (start + timedelta(hours=hour)).isoformat(' '))
+        for hour in range(200)
+        for i in range(4)  # hash0 has two gateway rows per hour
+    ]
+    conn.executemany('INSERT INTO qos_hourly_query_volume VALUES (?, ?, ?, ?)', rows)
+
+    since = start + timedelta(hours=190)
+    streamed = list(stream_hourly_volume(conn, since, placeholder='?', batch_size=4))
+    assert len(streamed) == 10 * 3
+    assert {row['query_count'] for row in streamed if row['subgraph_deployment_ipfs_hash'] == 'hash0'} == {20}
+
+    window = HourlyVolumeWindow(fetch_hours=lambda since: stream_hourly_volume(conn, since, placeholder='?', batch_size=7))
+    window.refresh(start + timedelta(hours=199, minutes=30))
+    query_fees, query_counts = window.totals()
+    assert query_counts == {'hash0': 168 * 20, 'hash1': 168 * 10, 'hash2': 168 * 10}
+    assert query_fees['hash0'] == 168 * 1.0
+
+def test_pg_meta_query_uses_normalized_timestamp(monkeypatch):
+    """Test that the pg-meta fallback writes `since` as a UTC literal built from its fields."""
+    sent = []
+
+    class Response:
+        status_code = 200
+        def json(self):
+            return []
+
+    def post_json(url, body, headers=None):
+        sent.append(body['query'])
+        return Response()
+
+    monkeypatch.setattr(supabase_api, 'post_json', post_json)
+    since = datetime(2024, 1, 1, 2, 30, tzinfo=timezone(timedelta(hours=2)))
+    supabase_api.query_hourly_volume_pg_meta(since)
+
+    assert "WHERE end_epoch >= '2024-01-01 00:30:00.000000'" in sent[0]
+    with pytest.raises(TypeError):
+        timestamp_literal("2024-01-01'; DROP TABLE qos_hourly_query_volume; --")
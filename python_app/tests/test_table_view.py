@@ -0,0 +1,68 @@
+import pandas as pd
+from ui.table_view import cached_csv, cached_frame, frame_to_csv, page_slice, query_frame
+from utils.formatting import apr_colors, color_apr
+from models.opportunities import OpportunityTable
+
+def make_frame(rows=120):
+    """Create a display frame with one row per subgraph."""
+    return pd.DataFrame({
+        'APR (%)': [float(i % 10) for i in range(rows)],
+        'IPFS Hash': [f'Qm{i:04d}' for i in range(rows)]
+    })
+
+def test_query_frame_filters_and_sorts():
+    """Test case-insensitive search on one column followed by a stable sort."""
+    df = make_frame()
+    result = query_frame(df, search='qm00', search_column='IPFS Hash', sort_by='APR (%)', ascending=False)
+
+    assert len(result) == 100
+    assert result['APR (%)'].is_monotonic_decreasing
+    assert list(result['IPFS Hash'][:2]) == ['Qm0009', 'Qm0019']  # Ties keep their original order
+    assert query_frame(df).equals(df)
+
+def test_page_slice_clamps_page():
+    """Test that pages hold page_size rows and out-of-range pages are clamped."""
+    df = make_frame()
+
+    rows, page, pages = page_slice(df, 3, 50)
+    assert (len(rows), page, pages) == (20, 3, 3)
+    assert rows['IPFS Hash'].iloc[0] == 'Qm0100'
+
+    rows, page, pages = page_slice(df, 9, 50)
+    assert (page, pages) == (3, 3)
+
+    rows, page, pages = page_slice(df.iloc[:0], 1, 50)
+    assert (len(rows), page, pages) == (0, 1, 1)
+
+def test_apr_colors_matches_color_apr():
+    """Test that the vectorized styling colors every value like color_apr."""
+    values = pd.Series([None, '-', 'abc', 0.5, 1, 3.2, 5, 5.01, 12])
+
+    assert list(apr_colors(values)) == [color_apr(value) for value in values]
+
+def test_cached_frame_builds_once_per_owner():
+    """Test that a display frame is built once per table and shared across reruns."""
+    table = OpportunityTable.from_opportunities([])
+    calls = []
+
+    def build():
+        calls.append(1)
+        return make_frame(3)
+
+    first = cached_frame(table, build)
+    assert cached_frame(table, build) is first
+    assert len(calls) == 1
+    assert frame_to_csv(first).decode('utf-8').splitlines()[0] == 'APR (%),IPFS Hash'
+
+def test_cached_csv_follows_query():
+    """Test that CSV bytes are reused for the same query and rebuilt when it or the frame changes."""
+    df = make_frame()
+    state = {}
+
+    first = cached_csv(state, 'table_csv', df, ('qm00', 'APR (%)', False), query_frame(df, 'qm00', 'IPFS Hash'))
+    assert isinstance(first, bytes) and len(first.decode('utf-8').splitlines()) == 101
+    assert cached_csv(state, 'table_csv', df, ('qm00', 'APR (%)', False), df) is first
+
+    second = cached_csv(state, 'table_csv', df, ('', 'APR (%)', False), df)
+    assert len(second.decode('utf-8').splitlines()) == 121
+    assert cached_csv(state, 'table_csv', make_frame(3), ('', 'APR (%)', False), make_frame(3)) != second
@@ -0,0 +1,106 @@
+import math
+import weakref
+from typing import Callable, MutableMapping, Optional, Sequence, Tuple
+import pandas as pd
+import streamlit as st
+from pandas.io.formats.style import Styler
+from utils.formatting import apr_colors
+
+PAGE_SIZE = 50
+PAGE_SIZES = (25, 50, 100, 250)
+
+# Frames built from an object (e.g. a snapshot's opportunity table), dropped with it
+_frames: 'weakref.WeakKeyDictionary[object, pd.DataFrame]' = weakref.WeakKeyDictionary()
+
+def cached_frame(owner: object, build: Callable[[], pd.DataFrame]) -> pd.DataFrame:
+    """Build a display frame once per `owner` and reuse it on every rerun."""
+    frame = _frames.get(owner)
+    if frame is None:
+        frame = _frames[owner] = build()
+    return frame
+
+def query_frame(
+    frame: pd.DataFrame,
+    search: str = '',
+    search_column: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    ascending: bool = False
+) -> pd.DataFrame:
+    """Filter rows whose `search_column` contains `search` (case-insensitive), then sort."""
+    if search and search_column in frame.columns:
+        frame = frame[frame[search_column].astype(str).str.contains(search, case=False, regex=False)]
+    if sort_by in frame.columns:
+        frame = frame.sort_values(sort_by, ascending=ascending, kind='stable')
+    return frame
+
+def page_slice(frame: pd.DataFrame, page: int, page_size: int) -> Tuple[pd.DataFrame, int, int]:
+    """Rows of one page, with the page clamped to range. Returns (rows, page, page count)."""
+    pages = max(1, math.ceil(len(frame) / page_size))
+    page = min(max(1, page), pages)
+    start = (page - 1) * page_size
+    return frame.iloc[start:start + page_size], page, pages
+
+def style_apr(frame: pd.DataFrame, apr_columns: Sequence[str]) -> Styler:
+    """Color APR columns one whole column at a time."""
+    columns = [column for column in apr_columns if column in frame.columns]
+    return frame.style.apply(apr_colors, subset=columns) if columns else frame.style
+
+def frame_to_csv(frame: pd.DataFrame) -> bytes:
+    """CSV bytes of a frame."""
+    return frame.to_csv(index=False).encode('utf-8')
+
+def cached_csv(state: MutableMapping, key: str, frame: pd.DataFrame, query: tuple, matching: pd.DataFrame) -> bytes:
+    """CSV bytes of `matching`, rebuilt only when the source frame or the `query` producing it changes.
+
+    One entry per `key` is kept in `state` (the session state), holding the
+    source frame so its identity can be checked on the next rerun.
+    """
+    cached = state.get(key)
+    if cached is None or cached[0] is not frame or cached[1] != query:
+        cached = state[key] = (frame, query, frame_to_csv(matching))
+    return cached[2]
+
+def render_table(
+    frame: pd.DataFrame,
+    key: str,
+    apr_columns: Sequence[str] = (),
+    search_column: Optional[str] = 'IPFS Hash',
+    default_sort: Optional[str] = None,
+    csv_file_name: Optional[str] = None,
+    csv_label: str = "Download CSV"
+) -> None:
+    """Render a frame one page at a time, with server-side search, sorting and styling.
+
+    Only the visible page is styled and sent to the browser. The CSV
+    download holds every row that matches the current search and sort; it
+    is generated once per search and sort, not on every rerun.
+    """
+    columns = list(frame.columns)
+    controls = st.columns([3, 2, 1, 1])
+    search = controls[0].text_input("Search", key=f"{key}_search", placeholder=search_column or '') if search_column else ''
+    sort_by = controls[1].selectbox(
+        "Sort by", columns, index=columns.index(default_sort) if default_sort in columns else 0, key=f"{key}_sort"
+    )
+    ascending = controls[2].toggle("Ascending", key=f"{key}_ascending")
+    page_size = controls[3].selectbox("Rows", PAGE_SIZES, index=PAGE_SIZES.index(PAGE_SIZE), key=f"{key}_page_size")
+
+    matching = query_frame(frame, search, search_column, sort_by, ascending)
+    pages = max(1, math.ceil(len(matching) / page_size))
+    page_key = f"{key}_page"
+    # Keep the page in range when a search or page size change shrinks the result
+    st.session_state[page_key] = min(st.session_state.get(page_key, 1), pages)
+    page = st.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+    rows, page, pages = page_slice(matching, int(page), page_size)
+
+    st.dataframe(style_apr(rows, apr_columns), hide_index=True)
+    start = (page - 1) * page_size
+    st.caption(f"Rows {start + 1 if len(rows) else 0}–{start + len(rows)} of {len(matching):,} (page {page} of {pages})")
+
+    if csv_file_name:
+        st.download_button(
+            label=csv_label,
+            data=cached_csv(st.session_state, f"{key}_csv", frame, (search, sort_by, ascending), matching),
+            file_name=csv_file_name,
+            mime='text/csv',
+            key=f"{key}_download"
+        )
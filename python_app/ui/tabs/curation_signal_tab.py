@@ -2,7 +2,8 @@ import streamlit as st
 import pandas as pd
 from typing import List
 from models.signals import UserOpportunity
-from utils.formatting import color_apr, format_currency, format_grt, format_percentage
+from ui.table_view import render_table
+from utils.formatting import format_currency, format_grt, format_percentage
 
 def render_curation_signal_tab(
     user_opportunities: List[UserOpportunity],
@@ -37,5 +38,4 @@ def render_curation_signal_tab(
     
     # Create and display table
     user_df = pd.DataFrame(user_data)
-    styled_user_df = user_df.style.map(color_apr, subset=['APR (%)'])
-    st.table(styled_user_df)
+    render_table(user_df, key='curation_signal', apr_columns=['APR (%)'])
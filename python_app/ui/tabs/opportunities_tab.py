@@ -1,22 +1,38 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-from typing import List
-from models.opportunities import Opportunity
-from models.allocation.optimizer import AllocationOptimizer
-from utils.formatting import color_apr, format_currency, format_grt, format_percentage
+from typing import Callable, Optional, Sequence
+from models.opportunities import Opportunity, OpportunityTable
+from models.allocation.optimizer import AllocationOptimizer, optimize_cached
+from ui.table_view import render_table
+from utils.formatting import format_currency, format_grt, format_percentage
 from api.graph_api import get_account_balance
+from utils.cache import SharedLRUCache
+from utils.config import RESULT_CACHE_SIZE
+
+@st.cache_resource
+def get_result_cache() -> SharedLRUCache:
+    """One optimizer result cache per server process, shared by every session."""
+    return SharedLRUCache(RESULT_CACHE_SIZE, name='allocation_results')
 
 def render_opportunities_tab(
-    opportunities: List[Opportunity],
+    opportunities: Sequence[Opportunity],
     grt_price: float,
-    wallet_address: str
+    wallet_address: str,
+    fetch_balance: Optional[Callable[[], float]] = None,
+    snapshot_id: Optional[str] = None
 ) -> None:
-    """Render the Find Opportunities tab content."""
+    """Render the Find Opportunities tab content.
+
+    `fetch_balance` returns the wallet's GRT balance, e.g. from a prefetch;
+    by default it is fetched here. With the `snapshot_id` of `opportunities`
+    the allocation is served from the process-wide result cache.
+    """
     st.subheader("Find Opportunities")
     
     # Get account balance
     try:
-        available_grt = get_account_balance(wallet_address)
+        available_grt = fetch_balance() if fetch_balance else get_account_balance(wallet_address)
         st.write(f"Available GRT Balance: {format_grt(available_grt)}")
         st.write(f"Value in USD: {format_currency(available_grt * grt_price)}")
     except Exception as e:
@@ -27,44 +43,46 @@ def render_opportunities_tab(
         st.warning("No GRT available for allocation.")
         return
     
-    # Initialize optimizer
-    optimizer = AllocationOptimizer(opportunities, grt_price)
-    
-    # Calculate optimal allocation
+    # Calculate optimal allocation, reusing the result of any earlier run with the same inputs
     try:
-        result = optimizer.optimize_allocation(available_grt)
+        if snapshot_id is None:
+            result = AllocationOptimizer(opportunities, grt_price).optimize_allocation(available_grt)
+        else:
+            cache = get_result_cache()
+            result = optimize_cached(cache, snapshot_id, wallet_address, opportunities, grt_price, available_grt)
+            stats = cache.stats()
+            st.caption(f"Result cache: {stats['size']:,} of {stats['maxsize']:,} entries, {stats['hit_rate']:.0%} hit rate")
         
         # Display allocation summary
         st.write(f"Optimal allocation of {format_grt(available_grt)} across subgraphs to maximize rewards.")
         
-        # Prepare data for display
-        data = []
-        for opp in opportunities:
-            allocated_amount = result.allocations.get(opp.ipfs_hash, 0)
-            if allocated_amount > 0:
-                # Calculate metrics for this allocation
-                signal_amount_after = opp.signal_amount + allocated_amount
-                signalled_tokens_after = opp.signalled_tokens + allocated_amount
-                portion_owned_after = signal_amount_after / signalled_tokens_after
-                estimated_earnings_after = opp.curator_share * portion_owned_after
-                apr_after = (estimated_earnings_after / (signal_amount_after * grt_price)) * 100
-
-                data.append({
-                    'Current Signal (GRT)': round(opp.signal_amount, 2),
-                    'Allocated Amount (GRT)': round(allocated_amount, 2),
-                    'Total Signal After (GRT)': round(signal_amount_after, 2),
-                    'Current APR (%)': round(opp.apr, 2),
-                    'APR After (%)': round(apr_after, 2),
-                    'Est. Annual Earnings ($)': round(estimated_earnings_after, 2),
-                    'Weekly Queries': opp.weekly_queries,
-                    'IPFS Hash': opp.ipfs_hash
-                })
+        # Compute the allocated rows column-wise, in table order
+        table = OpportunityTable.from_opportunities(opportunities)
+        rows = sorted(
+            position for position in (table.position(ipfs_hash) for ipfs_hash, amount in result.allocations.items() if amount > 0)
+            if position is not None
+        )
 
         # Display opportunities table
-        if data:
-            df = pd.DataFrame(data)
-            styled_df = df.style.map(color_apr, subset=['Current APR (%)', 'APR After (%)'])
-            st.table(styled_df)
+        if rows:
+            allocated = table.take(np.array(rows, dtype=np.int64))
+            allocated_amount = np.array([result.allocations[ipfs_hash] for ipfs_hash in allocated.ipfs_hash])
+            df = pd.DataFrame({
+                'Current Signal (GRT)': allocated.signal_amount.round(2),
+                'Allocated Amount (GRT)': allocated_amount.round(2),
+                'Total Signal After (GRT)': (allocated.signal_amount + allocated_amount).round(2),
+                'Current APR (%)': allocated.apr.round(2),
+                'APR After (%)': allocated.apr_with(grt_price, allocated_amount).round(2),
+                'Est. Annual Earnings ($)': allocated.earnings(allocated_amount).round(2),
+                'Weekly Queries': allocated.weekly_queries,
+                'IPFS Hash': allocated.ipfs_hash
+            })
+            render_table(
+                df,
+                key='allocation',
+                apr_columns=['Current APR (%)', 'APR After (%)'],
+                default_sort='Allocated Amount (GRT)'
+            )
 
             # Display results summary
             st.subheader("Allocation Results")
@@ -0,0 +1,164 @@
+import copy
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Tuple
+from utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+def in_streamlit() -> bool:
+    """Whether we are running inside a Streamlit server (as opposed to a script or CLI)."""
+    try:
+        from streamlit import runtime
+    except ImportError:
+        return False
+    return runtime.exists()
+
+def cache_data(ttl: int) -> Callable:
+    """Memoize a data-fetching function for `ttl` seconds.
+
+    Inside Streamlit this is `st.cache_data`, shared across sessions. Anywhere
+    else it is an in-process cache keyed on the call arguments, so the API
+    layer runs headless without importing Streamlit. Both return copies of the
+    cached value and expose `clear()`.
+    """
+    def decorator(func: Callable) -> Callable:
+        if in_streamlit():
+            import streamlit as st
+            return st.cache_data(ttl=ttl)(func)
+
+        entries: Dict[str, Tuple[float, object]] = {}
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = repr((args, sorted(kwargs.items())))
+            now = time.monotonic()
+            with lock:
+                entry = entries.get(key)
+            if entry is None or now - entry[0] >= ttl:
+                counter('cache_misses_total', function=func.__qualname__)
+                entry = (now, func(*args, **kwargs))
+                with lock:
+                    entries[key] = entry
+            else:
+                counter('cache_hits_total', function=func.__qualname__)
+            return copy.deepcopy(entry[1])
+
+        def clear() -> None:
+            with lock:
+                entries.clear()
+
+        wrapper.clear = clear
+        return wrapper
+
+    return decorator
+
+class LRUCache:
+    """Bounded mapping that evicts the least recently used entry, counting hits and misses.
+
+    Not locked; each instance belongs to one thread.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        """Return the cached value for `key`, or `default` on a miss."""
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return self._entries[key]
+
+    def put(self, key: Hashable, value) -> None:
+        """Store `value`, evicting the least recently used entry when full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups served from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self) -> None:
+        """Drop every entry and reset the counters."""
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def stats(self) -> Dict:
+        """Size, capacity, hits, misses and hit rate."""
+        return {
+            'size': len(self),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate
+        }
+
+class SharedLRUCache(LRUCache):
+    """LRUCache that threads and Streamlit sessions can share.
+
+    Lookups are counted in `cache_hits_total` and `cache_misses_total` under
+    the cache's `name`.
+    """
+
+    def __init__(self, maxsize: int, name: str):
+        super().__init__(maxsize)
+        self.name = name
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            misses = self.misses
+            value = super().get(key, default)
+            hit = self.misses == misses
+        counter('cache_hits_total' if hit else 'cache_misses_total', cache=self.name)
+        return value
+
+    def put(self, key: Hashable, value) -> None:
+        with self._lock:
+            super().put(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return super().stats()
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        """Return the cached value for `key`, computing and storing it on a miss.
+
+        `compute` runs outside the lock, so two callers missing on the same
+        key at once may both compute it.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+def report_error(message: str) -> None:
+    """Show an error in the Streamlit page, or log it when running headless."""
+    if in_streamlit():
+        import streamlit as st
+        st.error(message)
+    else:
+        logger.error(message)
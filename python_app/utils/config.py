@@ -9,6 +9,11 @@ SUPABASE_USERNAME = os.getenv('SUPABASE_USERNAME')
 SUPABASE_PASSWORD = os.getenv('SUPABASE_PASSWORD')
 SUPABASE_BASE_URL = "http://supabasekong-so4w8gock004k8kw8ck84o80.94.130.17.180.sslip.io"
 SUPABASE_API_URL = f"{SUPABASE_BASE_URL}/api/pg-meta/default/query"
+# Direct PostgreSQL connection string; when set, query volume is streamed
+# through a connection pool instead of the pg-meta endpoint (needs psycopg2)
+SUPABASE_DB_URL = os.getenv('SUPABASE_DB_URL')
+DB_POOL_SIZE = 4
+DB_FETCH_BATCH_SIZE = 2000  # Rows per round-trip from the server-side cursor
 
 # The Graph API configuration
 THEGRAPH_API_KEY = os.getenv('THEGRAPH_API_KEY')
@@ -18,6 +23,35 @@ GRT_PRICE_API_URL = f"https://gateway.thegraph.com/api/{THEGRAPH_API_KEY}/subgra
 # Default wallet for testing
 DEFAULT_WALLET = "0x74dbb201ecc0b16934e68377bc13013883d9417b"
 
+# On-disk snapshot of network deployments, refreshed incrementally
+SNAPSHOT_DB_PATH = os.getenv(
+    'SNAPSHOT_DB_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'deployments.sqlite')
+)
+
+# Memory-mapped opportunity snapshots shared by every worker process
+OPPORTUNITY_SNAPSHOT_DIR = os.getenv(
+    'OPPORTUNITY_SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'opportunities')
+)
+OPPORTUNITY_SNAPSHOTS_KEPT = 3  # Older snapshots are deleted once no longer current
+
+# HTTP client settings
+HTTP_POOL_SIZE = 16  # Keep-alive connections per host
+HTTP_MAX_RETRIES = 3
+HTTP_TIMEOUT = (5, 30)  # Connect and read timeouts in seconds
+GRAPH_FETCH_CONCURRENCY = int(os.getenv('GRAPH_FETCH_CONCURRENCY', '8'))  # Parallel id ranges per full fetch
+
 # Cache TTL settings (in seconds)
 CACHE_TTL_SHORT = 300  # 5 minutes
 CACHE_TTL_LONG = 1800  # 30 minutes
+QUERY_VOLUME_REFRESH_INTERVAL = 300  # Minimum seconds between hourly volume delta queries
+NETWORK_REFRESH_INTERVAL = 300  # Seconds between background refreshes of network data
+RESULT_CACHE_SIZE = 1024  # Optimizer results kept per process, keyed by snapshot, wallet, balance and parameters
+
+# Profiling: "cprofile" writes .prof files to PROFILE_DIR, "tracemalloc" records peak memory
+PROFILE_MODE = os.getenv('PROFILE_MODE')
+PROFILE_DIR = os.getenv(
+    'PROFILE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'profiles')
+)
@@ -1,3 +1,6 @@
+import numpy as np
+import pandas as pd
+
 def color_apr(val):
     """Apply color formatting to APR values in tables."""
     if val is None or val == '-':
@@ -14,6 +17,15 @@ def color_apr(val):
     except ValueError:
         return 'color: gray'
 
+def apr_colors(values: pd.Series) -> np.ndarray:
+    """Vectorized color_apr for a whole column, for Styler.apply."""
+    numeric = pd.to_numeric(values, errors='coerce')
+    return np.select(
+        [numeric.isna(), numeric > 5, numeric < 1],
+        ['color: gray', 'color: green', 'color: red'],
+        default='color: black'
+    )
+
 def format_currency(amount: float, decimals: int = 2) -> str:
     """Format a number as currency with commas and specified decimal places."""
     return f"${amount:,.{decimals}f}"
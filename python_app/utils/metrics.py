@@ -0,0 +1,247 @@
+import bisect
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+from utils.config import PROFILE_MODE, PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from 1 ms to 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes, from 1 MB to 4 GB
+MEMORY_BUCKETS = tuple(2.0 ** power for power in range(20, 33, 2))
+
+class Histogram:
+    """Fixed-bucket histogram of observed values, safe to share between threads."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Last slot is everything above the top bucket
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record one value."""
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile, inf if above every bucket."""
+        with self._lock:
+            counts = list(self._counts)
+        total = sum(counts)
+        if total == 0:
+            return 0.0
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            seen += count
+            if seen >= q * total:
+                return bound
+        return float('inf')
+
+    def summary(self) -> Dict:
+        """Count, sum, p50/p95/p99 and cumulative bucket counts keyed by upper bound."""
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+        cumulative = {}
+        seen = 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            cumulative[str(bound)] = seen
+        cumulative['+Inf'] = seen + counts[-1]
+        return {
+            'count': cumulative['+Inf'],
+            'sum': total_sum,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': cumulative
+        }
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_text(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    """Prometheus label set, e.g. {span="fetch",le="0.1"}."""
+    pairs = labels + extra
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+def _metric_key(name: str, labels: Dict) -> Tuple[str, LabelKey]:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+class MetricsRegistry:
+    """Process-wide counters and histograms, keyed by name and labels."""
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        self._histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, amount: float = 1, **labels) -> None:
+        """Add `amount` to a counter."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def counter_value(self, name: str, **labels) -> float:
+        """Current value of a counter, 0 if it was never incremented."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def histogram(self, name: str, buckets: Sequence[float] = LATENCY_BUCKETS, **labels) -> Histogram:
+        """Get or create a histogram."""
+        key = _metric_key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets)
+            return self._histograms[key]
+
+    def to_prometheus(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f'# TYPE {name} counter')
+                typed.add(name)
+            lines.append(f'{name}{_label_text(labels)} {value:g}')
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f'# TYPE {name} histogram')
+                typed.add(name)
+            summary = histogram.summary()
+            for bound, count in summary['buckets'].items():
+                lines.append(f'{name}_bucket{_label_text(labels, (("le", bound),))} {count}')
+            lines.append(f'{name}_sum{_label_text(labels)} {summary["sum"]:g}')
+            lines.append(f'{name}_count{_label_text(labels)} {summary["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self) -> Dict:
+        """Every metric as nested dicts: counters by name then label text, histograms as summaries."""
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = list(self._histograms.items())
+        result = {'counters': {}, 'histograms': {}}
+        for (name, labels), value in counters:
+            result['counters'].setdefault(name, {})[_label_text(labels)] = value
+        for (name, labels), histogram in histograms:
+            result['histograms'].setdefault(name, {})[_label_text(labels)] = histogram.summary()
+        return result
+
+    def reset(self) -> None:
+        """Drop every metric."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+REGISTRY = MetricsRegistry()
+
+def counter(name: str, amount: float = 1, **labels) -> None:
+    """Add `amount` to a counter in the process-wide registry."""
+    REGISTRY.counter(name, amount, **labels)
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block into the `span_seconds` histogram under `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.histogram('span_seconds', span=name).observe(time.perf_counter() - start)
+
+def timed(name: Optional[str] = None) -> Callable:
+    """Decorator form of `span`, named after the function by default."""
+    def decorator(func: Callable) -> Callable:
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def log_metrics(target: logging.Logger = logger) -> None:
+    """Write every metric as one JSON log line."""
+    target.info(json.dumps({'metrics': REGISTRY.to_json()}))
+
+# cProfile and tracemalloc are both process-wide, so only one block is profiled at a time
+_profile_lock = threading.Lock()
+
+@contextmanager
+def profiled(name: str, mode: Optional[str] = PROFILE_MODE, output_dir: str = PROFILE_DIR) -> Iterator[None]:
+    """Capture a profile of a block when profiling is switched on.
+
+    With mode "cprofile" the block's cProfile stats are written to
+    `output_dir`/<name>-<unix time>-<unique suffix>.prof. With "tracemalloc"
+    its peak traced memory is recorded in the `peak_memory_bytes` histogram
+    and the top allocation sites are logged. Any other mode runs the block
+    untouched. Blocks that start while another thread is profiling run
+    unprofiled and count `profiles_skipped_total`.
+    """
+    if mode not in ('cprofile', 'tracemalloc'):
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        counter('profiles_skipped_total', span=name)
+        yield
+        return
+    try:
+        if mode == 'cprofile':
+            with _cprofile(name, output_dir):
+                yield
+        else:
+            with _tracemalloc(name):
+                yield
+    finally:
+        _profile_lock.release()
+
+@contextmanager
+def _cprofile(name: str, output_dir: str) -> Iterator[None]:
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f'{name}-{int(time.time())}-{uuid.uuid4().hex[:8]}.prof')
+        profiler.dump_stats(path)
+        logger.info(f"Profile for {name} written to {path}")
+
+@contextmanager
+def _tracemalloc(name: str) -> Iterator[None]:
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+        if not already_tracing:
+            tracemalloc.stop()
+        REGISTRY.histogram('peak_memory_bytes', buckets=MEMORY_BUCKETS, span=name).observe(peak)
+        logger.info(f"Peak memory for {name}: {peak / 2**20:.1f} MB; top allocations:\n" +
+                    '\n'.join(str(stat) for stat in top))